@@ -1,19 +1,24 @@
 from typing import Final
-from abc import ABC, abstractmethod
 from st_files_connection import FilesConnection
 from vwlogger import trace
 from vwlogger import performance
 from streamlit_autorefresh import st_autorefresh
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 
 import streamlit as st
-import threading
+import time
+import os
 
 
-import json
 import logging
 import vwlogger
+import vwmetrics
+import pandas as pd
 import streamlit_helper as stHelper
+import streamlit_datasources as stData
+import streamlit_diskcache as stDisk
+import streamlit_plan as stPlan
 
 CONST_VER						:Final[str] = '1.2'
 
@@ -27,6 +32,22 @@ CONST_APP_NAME					:Final[str] = 'JSON2StreamLit'
 CONST_SESSION_VAR_PAGE			:Final[str] = 'PageNumber'
 CONST_APP_CFG_PAGEREFRESH		:Final[str] = 'pageRefresh'
 CONST_APP_NEXTMODE				:Final[str] = 'nextMode'
+CONST_APP_CFG_DATACACHE			:Final[str] = 'DataCache'
+CONST_APP_CFG_DATACACHE_MB		:Final[str] = 'maxMB'
+CONST_APP_CFG_DATACACHE_WORKERS	:Final[str] = 'workers'
+CONST_APP_CFG_DATACACHE_TIMEOUT	:Final[str] = 'timeout'
+CONST_APP_CFG_DATACACHE_DISK	:Final[str] = 'diskPath'
+CONST_APP_CFG_DATACACHE_DISK_MB	:Final[str] = 'diskMB'
+CONST_APP_CFG_DATACACHE_SNAP	:Final[str] = 'snapshotPath'
+CONST_APP_CFG_DATACACHE_SNAP_MB	:Final[str] = 'snapshotMB'
+CONST_APP_CFG_DATACACHE_FAILS	:Final[str] = 'breakerFailures'
+CONST_APP_CFG_DATACACHE_COOL	:Final[str] = 'breakerCooldown'
+CONST_APP_CFG_METRICS			:Final[str] = 'Metrics'
+CONST_APP_CFG_METRICS_PORT		:Final[str] = 'port'
+CONST_APP_CFG_METRICS_FILE		:Final[str] = 'file'
+CONST_APP_CFG_METRICS_HOST		:Final[str] = 'host'	# 0.0.0.0 to scrape from outside the host, default 127.0.0.1
+CONST_APP_CFG_RENDER			:Final[str] = 'Render'
+CONST_APP_CFG_RENDER_WORKERS	:Final[str] = 'workers'
 
 CONST_APP_DEF_INC				:Final[int] = 1
 CONST_APP_MAX_PAGES				:Final[int] = 100
@@ -41,14 +62,11 @@ CONST_SOURCEDATA_TTL			:Final[int] = 60000 # 10 mins.
 
 
 
-#@st.cache_data
 @performance
 @trace
-def loadConfiguration( f : str, mode : str = CONST_READ_ONLY_MODE ) -> dict:
-	with open( f, mode) as fHndl :
-		    cfgData = json.load( fHndl )
-	
-	return (cfgData)
+def loadConfiguration( f : str ) -> dict:
+	# cached against the file's mtime/size, the file is only re-read when it is edited.
+	return stPlan.g_planCache.json(f)
 
 def version():
 	print(f"{version.__module__}.{version.__name__} {CONST_VER}")
@@ -60,83 +78,53 @@ def secret_datasource_sectionKey( id : str , env : str = CONST_DEF_ENV) -> str :
 
 @performance
 @trace
-def persitDataSources( configuration : dict, lang : str =  stHelper.CONST_CFG_APP_LANG) -> bool: 
+def persitDataSources( plan : stPlan.PagePlan, timeout : int = stData.CONST_DEF_LOAD_TIMEOUT) -> bool: 
 	
-	if 'Resources' not in configuration[lang]:
-		logging.warning(f'No Resources section defined. skipping loading of Data sources !')
+	if len(plan.dataSources)==0:
+		logging.warning(f'No data sources used by this page. skipping loading of Data sources !')
 		return False
 
-	RESOURCES : Final[str] = configuration[lang]['Resources']
-	
-	try:
-		if ( 'DataSources' not in RESOURCES):
-			logging.warning('missing DataSources from JSON')
-			return False
-
-		DATASOURCES : Final[str]=RESOURCES['DataSources']
-		logging.info(f"loading data resources x{len(DATASOURCES)}")
+	logging.info(f"registering data resources x{len(plan.dataSources)}")
 
-		for i,ds in enumerate(DATASOURCES):
-			datasource_section = secret_datasource_sectionKey(ds['id'])
-			logging.info(f"Loading data source :{ds['id']} using section {datasource_section} from secret")
+	# plan.dataSources only holds the sources a rendered canvas points at, and nothing is
+	# fetched here, the first uxCanvas to use a source pulls it through its handle.
+	# A source that fails to register is left out, its canvases report it and the rest still load.
+	keys = {}
+	for ds in plan.dataSources:
+		try:
+			datasource_section = secret_datasource_sectionKey(ds.id)
+			logging.info(f"Registering data source :{ds.id} using section {datasource_section} from secret")
 			logging.info(f"Secret: {datasource_section} : fs:{st.secrets[datasource_section].fs}")
 			logging.info(f"Secret: {datasource_section} : uri:{st.secrets[datasource_section].data_uri}")
 			logging.info(f"Secret: {datasource_section} : type:{st.secrets[datasource_section].format}")
 			logging.info(f"Secret: {datasource_section} : ttl:{st.secrets[datasource_section].ttl}")
 
-			#conn = st.connection(st.secrets[datasource_section].fs, type=FilesConnection)
-			#df = conn.read(st.secrets[datasource_section].data_uri, input_format=st.secrets[datasource_section].format, ttl=st.secrets[datasource_section].ttl)
-			df = loadDataSource(st.secrets[datasource_section].data_uri,
-								st.secrets[datasource_section].format,
-								st.secrets[datasource_section].ttl,
-								st.secrets[datasource_section].fs,
-								FilesConnection)
-
-			stHelper.addDataSource(ds['id'],df)
-				
-		return True
-
-	except Exception as err:
-		logging.warning(f"Error:{err} - lang:{lang} element:{e} default: {default} applied.... ")
-		return default
-
-#@st.cache_data(ttl=CONST_SOURCEDATA_TTL)
-@performance
-@trace
-def loadDataSource ( uri : str, format : str, ttl : int ,fs : str, fileConnection) -> dict:
-	conn = st.connection(fs, type=fileConnection)
-	df = conn.read(uri, input_format=format, ttl=ttl)
-	return df
-
-@performance
-@trace
-def persitCanvas( configuration : dict, lang : str =  stHelper.CONST_CFG_APP_LANG) -> bool: 
-	
-	if 'Resources' not in configuration[lang]:
-		logging.warning(f'No Resources section defined. skipping loading of Canvas sources !')
-		return False
-
-	RESOURCES : Final[str] = configuration[lang]['Resources']
-
-	try:
-
-		if ( 'Canvas' not in RESOURCES):
-			logging.warning('missing Canvas from JSON')
-			return False
-
-		CANVASSOURCES : Final[str]=RESOURCES['Canvas']
-		logging.info(f"loading canvas resources x{len(CANVASSOURCES)}")
-
-		for i,cr in enumerate(CANVASSOURCES):
-			logging.info(f'persiting canvas resource {cr}')
-			stHelper.addCanvasResource(cr['id'],cr)
-		
-		return True
-
-	except Exception as err:
-		logging.warning(f"Error:{err} - lang:{lang} element:{e} default: {default} applied.... ")
-		return default
-
+			spec = stData.DataSourceSpec(ds.id,
+										 st.secrets[datasource_section].fs,
+										 st.secrets[datasource_section].data_uri,
+										 st.secrets[datasource_section].format,
+										 st.secrets[datasource_section].ttl,
+										 st.secrets[datasource_section].get('timeout',timeout),
+										 ds.configuration.get(stData.CONST_CFG_DS_DTYPES),
+										 ds.configuration.get(stData.CONST_CFG_DS_DATETIMES),
+										 ds.columns,
+										 ds.window)
+
+			# keyed by the spec, the columns and window it carries are the page's own
+			stHelper.addDataSource(spec.key(),stData.DataSourceHandle(spec, dataSourceLoader(spec, FilesConnection)),overwrite=True)
+			keys[ds.id] = spec.key()
+
+		except Exception as err:
+			logging.error(f"Error:{err} - data source {ds.id} not registered")
+
+	stHelper.usePageDataSources(keys)
+	return len(keys)==len(plan.dataSources)
+
+def dataSourceLoader ( spec : stData.DataSourceSpec, fileConnection) :
+	# the connection is resolved here, on the script thread, so the loader can then be run
+	# from the load pool or the background refresher.
+	fsys = st.connection(spec.fs, type=fileConnection).fs
+	return lambda : stData.readDataSource(fsys, spec)
 
 @performance
 @trace
@@ -158,7 +146,8 @@ def incrementDashboardPageIdx(nom : str  , n : int , m : int = CONST_APP_MAX_PAG
 	return st.session_state[nom]
 
 def getCfgOptionInt( configuration : dict, nom : str, default : int ) -> int :
-	logging.info(configuration)
+	if vwlogger.debugPayloads():
+		logging.debug(configuration)
 	if nom not in configuration :
 		logging.warning (f'Using default value of {default} for configuration option {nom}')
 		return default
@@ -177,17 +166,38 @@ def getCfgOptionStr( configuration : dict, nom : str, default : int ) -> str :
 @performance
 @trace
 def main( *args ) -> None :
+
+	# copy-on-write lets every canvas take a zero-copy view of a cached frame. It is always
+	# on from pandas 3.0, the app opts in on 2.x (the data modules leave the option alone).
+	if int(pd.__version__.split('.')[0]) == 2:
+		pd.set_option('mode.copy_on_write', True)
 	
 	AppCfg = loadConfiguration(f'./{CONST_APP_CFG}')
 
 	if CONST_APP_CFG_ENV not in AppCfg[CONST_APP_NAME] :
 		logging.warning (f'missing env key, using {CONST_DEF_ENV} ') 
-		AppCfg[CONST_APP_NAME][CONST_APP_CFG_ENV] = CONST_DEF_ENV
+		# AppCfg is the PlanCache copy every session shares, the default goes on a copy of it
+		AppCfg = {**AppCfg, CONST_APP_NAME : {**AppCfg[CONST_APP_NAME], CONST_APP_CFG_ENV : CONST_DEF_ENV}}
 
 	appMode = getCfgOptionStr(AppCfg[CONST_APP_NAME],
 							  CONST_APP_NEXTMODE, 'manual') # TODO issue constant for manual.
 
 	logging.info(f'{CONST_APP_NAME} operating in {AppCfg[CONST_APP_NAME][CONST_APP_CFG_ENV] } mode')
+	dataCacheCfg = AppCfg[CONST_APP_NAME].get(CONST_APP_CFG_DATACACHE,{})
+	stData.g_dataCache.setMaxBytes(getCfgOptionInt(dataCacheCfg,CONST_APP_CFG_DATACACHE_MB,stData.CONST_DEF_CACHE_MB)*stData.CONST_BYTES_PER_MB)
+	stData.setLoadWorkers(getCfgOptionInt(dataCacheCfg,CONST_APP_CFG_DATACACHE_WORKERS,stData.CONST_DEF_LOAD_WORKERS))
+	stDisk.g_diskCache.configure(getCfgOptionStr(dataCacheCfg,CONST_APP_CFG_DATACACHE_DISK,stDisk.CONST_DEF_DISK_PATH),
+								 getCfgOptionInt(dataCacheCfg,CONST_APP_CFG_DATACACHE_DISK_MB,stDisk.CONST_DEF_DISK_MB)*stDisk.CONST_BYTES_PER_MB)
+	stData.g_breakers.configure(getCfgOptionInt(dataCacheCfg,CONST_APP_CFG_DATACACHE_FAILS,stData.CONST_DEF_BREAKER_FAILURES),
+								getCfgOptionInt(dataCacheCfg,CONST_APP_CFG_DATACACHE_COOL,stData.CONST_DEF_BREAKER_COOLDOWN))
+	stDisk.g_snapshots.configure(getCfgOptionStr(dataCacheCfg,CONST_APP_CFG_DATACACHE_SNAP,stDisk.CONST_DEF_SNAPSHOT_PATH),
+								 getCfgOptionInt(dataCacheCfg,CONST_APP_CFG_DATACACHE_SNAP_MB,stDisk.CONST_DEF_SNAPSHOT_MB)*stDisk.CONST_BYTES_PER_MB)
+	metricsCfg = AppCfg[CONST_APP_NAME].get(CONST_APP_CFG_METRICS,{})
+	if getCfgOptionInt(metricsCfg,CONST_APP_CFG_METRICS_PORT,0) > 0:
+		vwmetrics.serveHttp(getCfgOptionInt(metricsCfg,CONST_APP_CFG_METRICS_PORT,0),
+							getCfgOptionStr(metricsCfg,CONST_APP_CFG_METRICS_HOST,vwmetrics.CONST_DEF_HTTP_HOST))
+	renderCfg = AppCfg[CONST_APP_NAME].get(CONST_APP_CFG_RENDER,{})
+	stHelper.setBuildWorkers(getCfgOptionInt(renderCfg,CONST_APP_CFG_RENDER_WORKERS,stHelper.CONST_DEF_BUILD_WORKERS))
 	maxDefinedPages=len(AppCfg[CONST_APP_NAME][CONST_APP_CFG_PAGES]) # TODO issue if no pages defined..... guess there should be at least 1
 	pageIdx=incrementDashboardPageIdx(CONST_SESSION_VAR_PAGE,
 									  CONST_APP_DEF_INC,maxDefinedPages)
@@ -198,13 +208,16 @@ def main( *args ) -> None :
 	logging.info(f'Render Page {pageIdx} of {maxDefinedPages}- Started')
 	pageCfgFile = AppCfg[CONST_APP_NAME][CONST_APP_CFG_PAGES][pageIdx][CONST_APP_CFG_PAGES_CFG] # TODO issue if no pages defined
 	logging.info(f'Loading page configuration {pageIdx} = {pageCfgFile}')
-	cfg = loadConfiguration(f'{CONST_DEF_PATH}{pageCfgFile}')
-	stHelper.uxInit(cfg)
-	persitDataSources(cfg)
-	persitCanvas(cfg)
-	stHelper.uxSidebar(cfg)
-	stHelper.uxContainer(cfg,cfg[stHelper.CONST_CFG_APP_LANG][stHelper.CONST_CFG_APP_SITE])
-	stHelper.uxRenderMatrix(cfg);
+	plan = stPlan.loadPagePlan(f'{CONST_DEF_PATH}{pageCfgFile}')
+	stHelper.uxInit(plan)
+	persitDataSources(plan,
+					  timeout=getCfgOptionInt(dataCacheCfg,CONST_APP_CFG_DATACACHE_TIMEOUT,stData.CONST_DEF_LOAD_TIMEOUT))
+	stHelper.uxPrepareCanvases(plan)
+	stHelper.uxSidebar(plan)
+	stHelper.uxContainer(plan.containers)
+	stHelper.uxRenderMatrix(plan);
+	stHelper.uxDataFreshness(plan)
+	stHelper.uxDiscardPrebuilt()
 	
 	if (appMode == CONST_DEF_AUTO_NEXTMODE ):
 		refreshDelay=AppCfg[CONST_APP_NAME][CONST_APP_CFG_PAGES][pageIdx]['pageRefresh'] # TODO issue if no pages defined or set to 0
@@ -217,12 +230,49 @@ def main( *args ) -> None :
 		
 	
 	
+def scriptSessionId() -> str :
+	ctx = get_script_run_ctx()
+	return None if ctx is None else ctx.session_id
+
+def exportMetricsFile() -> bool :
+	"""Rewrite the Prometheus text file named by Metrics.file, for a textfile collector to pick up."""
+	try:
+		path = loadConfiguration(CONST_APP_CFG)[CONST_APP_NAME].get(CONST_APP_CFG_METRICS,{}).get(CONST_APP_CFG_METRICS_FILE,'')
+		if len(path)==0:
+			return False
+		vwmetrics.g_metrics.writeTextFile(path)
+		return True
+
+	except Exception as err:
+		logging.error(f"Error:{err} - metrics file not written")
+		return False
+
+def exportRunTrace( since : float ) -> bool :
+	"""Write this rerun's spans as a Chrome trace, when vwlogger's trace directory is set."""
+	traceDir = vwlogger.traceDir()
+	if traceDir is None:
+		return False
+	try:
+		os.makedirs(traceDir, exist_ok=True)
+		path = os.path.join(traceDir, f'{CONST_APP_NAME}-{scriptSessionId()}-{since*1000:.0f}.trace.json')
+		count = vwlogger.g_spans.exportChromeTrace(path, since=since, session=scriptSessionId())
+		logging.info(f'{count} spans of this run written to {path}')
+		return True
+
+	except Exception as err:
+		logging.error(f"Error:{err} - run trace not written")
+		return False
+
 # ----------------------------------------------------------------
 # ----------------------------------------------------------------
 # ----------------------------------------------------------------
-logging.basicConfig(level=vwlogger.CONST_DEF_LOGLEVEL,format=vwlogger.CONST_LOGGING_FMT) # TODO better way to enable logging.... env var.
+vwlogger.setupLogging() # level, queue size and drop policy from the VWLOGGER_* env vars
 logging.info(f"{CONST_APP_NAME} {CONST_VER}")
 version()
+vwlogger.g_spans.sessionProvider = scriptSessionId
+runStart = time.time()
 main()
+exportRunTrace(runStart)
+exportMetricsFile()
 
 #st.dataframe(cfg)
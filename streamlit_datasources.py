@@ -0,0 +1,694 @@
+import time
+import logging
+import threading
+import itertools
+import pandas as pd
+import streamlit_diskcache as stDisk
+import streamlit_transforms as stTransforms
+import vwmetrics
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Final
+from vwlogger import trace
+from vwlogger import performance
+
+CONST_VER					: Final[str]	= '1.0'
+
+CONST_FMT_CSV				: Final[str]	= 'csv'
+CONST_FMT_PARQUET			: Final[str]	= 'parquet'
+CONST_FMT_JSON				: Final[str]	= 'json'
+CONST_FMT_JSONL				: Final[str]	= 'jsonl'
+
+CONST_DEF_TTL				: Final[int]	= 600 	# seconds, same unit as the ttl in secrets.toml
+CONST_DEF_CACHE_MB			: Final[int]	= 512
+CONST_BYTES_PER_MB			: Final[int]	= 1024*1024
+CONST_DEF_REFRESH_WORKERS	: Final[int]	= 4
+CONST_DEF_REFRESH_POLL		: Final[float]	= 1.0	# seconds between checks for expired entries
+CONST_DEF_REFRESH_IDLE		: Final[int]	= 3		# stop refreshing once unused for this many ttl periods
+CONST_MIN_REFRESH_IDLE		: Final[int]	= 300	# ... but never sooner than this many seconds
+CONST_DEF_LOAD_WORKERS		: Final[int]	= 4
+CONST_DEF_LOAD_TIMEOUT		: Final[int]	= 30	# seconds a single source may take before it is reported as timed out
+CONST_DEF_BREAKER_FAILURES	: Final[int]	= 3		# consecutive failures that open a source's circuit
+CONST_DEF_BREAKER_COOLDOWN	: Final[int]	= 60	# seconds an open circuit stops fetches before one trial is let through
+
+CONST_CFG_DS_DTYPES			: Final[str]	= 'dtypes'
+CONST_CFG_DS_DATETIMES		: Final[str]	= 'datetimes'
+CONST_CFG_DS_WINDOW			: Final[str]	= 'window'
+CONST_WINDOW_CHUNK_ROWS		: Final[int]	= 100000	# rows parsed per chunk when a csv is read through a window
+
+
+def copyOnWrite() -> bool:
+	"""Whether pandas copies on write, always from 3.0, on 2.x only when the app opted in (see app.main)."""
+	return int(pd.__version__.split('.')[0]) >= 3 or pd.get_option('mode.copy_on_write') is True
+
+
+
+class DataSourceSpec:
+	"""Where a data source lives and how long a fetched copy stays fresh.
+
+	Built from the Resources.DataSources entry and its secrets.toml section. The
+	cache key is (fs, uri, format) plus the declared column types, so every page
+	and session that points at the same object, typed the same way, shares one copy.
+
+	dtypes maps column -> pandas dtype and datetimes maps column -> strftime format
+	('' to let pandas infer it), both are applied once per fetch.
+
+	columns is the projection the page needs, None reads every column. It is part
+	of the key, two pages that read different columns hold separate copies.
+
+	window is (on, seconds) from stTransforms.windowSpec, only rows whose on
+	timestamp is within the last seconds at fetch time are read. Also in the key.
+	"""
+	__slots__ = ('id', 'fs', 'uri', 'format', 'ttl', 'timeout', 'dtypes', 'datetimes', 'columns', 'window')
+
+	def __init__(self, id : str, fs : str, uri : str, format : str, ttl : int = CONST_DEF_TTL, timeout : int = CONST_DEF_LOAD_TIMEOUT,
+				 dtypes : dict = None, datetimes : dict = None, columns = None, window : tuple = None):
+		self.id		= id
+		self.fs		= fs
+		self.uri	= uri
+		self.format	= format
+		self.ttl	= CONST_DEF_TTL if ttl is None else int(ttl)
+		self.timeout= CONST_DEF_LOAD_TIMEOUT if timeout is None else float(timeout)
+		self.dtypes	= dict(dtypes or {})
+		self.datetimes = dict(datetimes or {})
+		self.window = None if window is None else tuple(window)
+		# the window column is read even when no canvas plots it
+		self.columns = None if columns is None else tuple(sorted(set(columns) | (set() if self.window is None else {self.window[0]})))
+
+	def key(self) -> tuple:
+		return (self.fs, self.uri, self.format, tuple(sorted(self.dtypes.items())), tuple(sorted(self.datetimes.items())), self.columns, self.window)
+
+	def __str__(self):
+		return f'DataSource {self.id} [{self.fs}:{self.uri} as {self.format}, ttl:{self.ttl}s]'
+
+
+class DataSourceEntry:
+	"""A fetched DataFrame plus the bookkeeping the cache needs.
+
+	version is unique across the process and changes on every fetch, so it can be
+	used by anything downstream that wants to key work on 'this copy of the data'.
+	"""
+	__slots__ = ('key', 'df', 'loadedAt', 'ttl', 'nbytes', 'version')
+
+	def __init__(self, key : tuple, df, ttl : int, version : int, loadedAt : float = None):
+		self.key		= key
+		self.df			= df
+		self.ttl		= ttl
+		self.version	= version
+		self.loadedAt	= time.time() if loadedAt is None else loadedAt
+		self.nbytes		= frameSize(df)
+
+	def view(self):
+		"""A copy of the cached frame that its reader can change without touching the cache.
+
+		Zero-copy under copy-on-write, which keeps a painter's edits out of the shared
+		frame. Without it (pandas 2.x not opted in) the view has to be a deep copy.
+		"""
+		return self.df.copy(deep=not copyOnWrite())
+
+	def age(self) -> float:
+		return time.time()-self.loadedAt
+
+	def expired(self) -> bool:
+		return self.age() >= self.ttl
+
+
+class DataSourceUnavailable(Exception):
+	"""Raised instead of fetching a source whose circuit is open."""
+
+
+class CircuitBreakers:
+	"""A circuit breaker per data source key.
+
+	failures consecutive failed fetches open the circuit, for cooldown seconds
+	after that no fetch is attempted. Then a single trial fetch is let through
+	(half open), its success closes the circuit and its failure opens it again.
+	"""
+
+	def __init__(self, failures : int = CONST_DEF_BREAKER_FAILURES, cooldown : int = CONST_DEF_BREAKER_COOLDOWN):
+		self.failures	= failures
+		self.cooldown	= cooldown
+		self.trips		= 0
+		self.rejected	= 0
+		self._states	= {}	# key -> [consecutive failures, open until, trial in flight, last error]
+		self._lock		= threading.Lock()
+
+	def configure(self, failures : int, cooldown : int) -> None:
+		with self._lock:
+			self.failures	= max(1,failures)
+			self.cooldown	= cooldown
+
+	def allow(self, key : tuple) -> bool:
+		"""May a fetch of key go ahead now, claims the trial when the cooldown is over."""
+		with self._lock:
+			state = self._states.get(key)
+			if state is None or state[1] == 0:
+				return True
+			if time.time() >= state[1] and not state[2]:
+				state[2] = True
+				return True
+			self.rejected += 1
+			return False
+
+	def isOpen(self, key : tuple) -> bool:
+		with self._lock:
+			state = self._states.get(key)
+			return state is not None and state[1] > 0 and (time.time() < state[1] or state[2])
+
+	def rejects(self, key : tuple) -> bool:
+		"""isOpen, counted as a rejected fetch when it is. For callers that would only wait on
+		a fetch already running, they never claim the half open trial."""
+		with self._lock:
+			state = self._states.get(key)
+			if state is None or state[1] == 0 or (time.time() >= state[1] and not state[2]):
+				return False
+			self.rejected += 1
+			return True
+
+	def success(self, key : tuple) -> None:
+		with self._lock:
+			self._states.pop(key, None)
+
+	def failure(self, key : tuple, err : Exception) -> None:
+		with self._lock:
+			state = self._states.setdefault(key, [0, 0, False, None])
+			state[0] += 1
+			state[3] = err
+			if state[2] or state[0] >= self.failures:
+				state[1] = time.time()+self.cooldown
+				state[2] = False
+				self.trips += 1
+				logging.error(f'circuit opened for {key} after {state[0]} failures, no fetches for {self.cooldown}s - {err}')
+
+	def lastError(self, key : tuple) -> Exception:
+		with self._lock:
+			state = self._states.get(key)
+			return None if state is None else state[3]
+
+	def stats(self) -> dict:
+		with self._lock:
+			return {'open' : sum(1 for state in self._states.values() if state[1] > 0), 'trips' : self.trips, 'rejected' : self.rejected}
+
+
+class DataSourceCache:
+	"""Process wide LRU cache of data source DataFrames.
+
+	Entries expire on their own ttl and the least recently used ones are evicted
+	once the total size goes over maxBytes. The most recently used entry is never
+	evicted, even when on its own it is bigger than the budget.
+
+	With a snapshot store every fetched frame is also saved to disk, and a cold
+	miss that can revalidate is answered from the saved snapshot (counted as
+	restored) while the real fetch runs in the background.
+
+	Fetches are single flight per key: while one caller runs the loader, others
+	asking for the same key (other sessions, the refresher) wait for and share
+	its result instead of starting their own, they are counted as coalesced. With
+	breakers, a source whose circuit is open raises DataSourceUnavailable rather
+	than being fetched.
+	"""
+
+	def __init__(self, maxBytes : int = CONST_DEF_CACHE_MB*CONST_BYTES_PER_MB, snapshots = None, breakers : CircuitBreakers = None):
+		self.maxBytes	= maxBytes
+		self.snapshots	= snapshots
+		self.breakers	= breakers
+		self.hits		= 0
+		self.misses		= 0
+		self.stale		= 0
+		self.restored	= 0
+		self.coalesced	= 0
+		self.evictions	= 0
+		self._inflight	= {}
+		self._entries	= OrderedDict()
+		self._totalBytes= 0
+		self._lock		= threading.Lock()
+		self._versions	= itertools.count(1)
+
+	def setMaxBytes(self, maxBytes : int) -> None:
+		with self._lock:
+			self.maxBytes = maxBytes
+			self._evict()
+
+	def peek(self, key : tuple) -> DataSourceEntry:
+		with self._lock:
+			return self._entries.get(key)
+
+	@performance
+	@trace
+	def get(self, spec : DataSourceSpec, loader, revalidate = None) -> DataSourceEntry:
+		"""Return the cached entry for spec, calling loader() on a miss.
+
+		When revalidate is given an expired entry is still returned straight away and
+		revalidate(spec, loader) is left to fetch the replacement, only a cold miss
+		waits on the loader.
+		"""
+		key = spec.key()
+		with self._lock:
+			entry = self._entries.get(key)
+			fresh = entry is not None and not entry.expired()
+			stale = entry is not None and not fresh and revalidate is not None
+			if fresh or stale:
+				self._entries.move_to_end(key)
+			if fresh:
+				self.hits += 1
+			elif stale:
+				self.stale += 1
+			else:
+				self.misses += 1
+
+		if fresh:
+			return entry
+
+		if stale:
+			revalidate(spec, loader)
+			return entry
+
+		if entry is None and revalidate is not None and self.snapshots is not None:
+			snapshot = self.snapshots.restore(key)
+			if snapshot is not None:
+				entry = self.put(key, snapshot[0], spec.ttl, loadedAt=snapshot[1])
+				with self._lock:
+					self.restored += 1
+				if entry.expired():
+					revalidate(spec, loader)
+				return entry
+
+		logging.info(f'{"expired" if entry is not None else "missing"} cache entry, fetching {spec}')
+		return self.load(spec, loader)
+
+	def load(self, spec : DataSourceSpec, loader) -> DataSourceEntry:
+		"""Fetch spec with loader() and cache it, or join the fetch of it already in flight.
+
+		A caller joining a fetch waits at most spec.timeout seconds for it (TimeoutError),
+		and does not wait at all while the source's circuit is open.
+		"""
+		key = spec.key()
+		with self._lock:
+			future = self._inflight.get(key)
+			leader = future is None
+			if leader:
+				future = self._inflight[key] = Future()
+			else:
+				self.coalesced += 1
+
+		if not leader:
+			# an open circuit means the fetch in flight is the one that keeps failing or hanging
+			if self.breakers is not None and self.breakers.rejects(key):
+				raise DataSourceUnavailable(f'{spec.id} is failing, not waiting on its fetch - {self.breakers.lastError(key)}')
+			logging.info(f'joined the fetch of {spec} already in flight')
+			return future.result(timeout=spec.timeout)
+
+		try:
+			if self.breakers is not None and not self.breakers.allow(key):
+				raise DataSourceUnavailable(f'{spec.id} is failing, fetches paused - {self.breakers.lastError(key)}')
+			s = time.perf_counter()
+			df = loader()
+			g_fetchSeconds.observe(time.perf_counter()-s, source=spec.id)
+			future.set_result(self.put(key, df, spec.ttl))
+			if self.breakers is not None:
+				self.breakers.success(key)
+		except BaseException as err:
+			g_fetchErrors.inc(source=spec.id, error=type(err).__name__)
+			if self.breakers is not None and not isinstance(err, DataSourceUnavailable):
+				self.breakers.failure(key, err)
+			future.set_exception(err)
+		finally:
+			with self._lock:
+				self._inflight.pop(key, None)
+		return future.result()
+
+	def lastGood(self, spec : DataSourceSpec) -> DataSourceEntry:
+		"""The last good copy of spec however old it is, from memory or its snapshot, None if there is none."""
+		key = spec.key()
+		entry = self.peek(key)
+		if entry is None and self.snapshots is not None:
+			snapshot = self.snapshots.restore(key)
+			if snapshot is not None:
+				entry = self.put(key, snapshot[0], spec.ttl, loadedAt=snapshot[1])
+				with self._lock:
+					self.restored += 1
+		return entry
+
+	def put(self, key : tuple, df, ttl : int, loadedAt : float = None) -> DataSourceEntry:
+		"""Cache df under key, a frame without loadedAt is a new fetch and is snapshotted."""
+		entry = DataSourceEntry(key, df, ttl, next(self._versions), loadedAt)
+		if loadedAt is None and self.snapshots is not None:
+			self.snapshots.save(key, df, entry.loadedAt)
+		with self._lock:
+			old = self._entries.pop(key, None)
+			if old is not None:
+				self._totalBytes -= old.nbytes
+			self._entries[key] = entry
+			self._totalBytes += entry.nbytes
+			self._evict()
+		return entry
+
+	def invalidate(self, key : tuple) -> bool:
+		with self._lock:
+			entry = self._entries.pop(key, None)
+			if entry is None:
+				return False
+			self._totalBytes -= entry.nbytes
+			return True
+
+	def _evict(self) -> None:
+		while self._totalBytes > self.maxBytes and len(self._entries) > 1:
+			key, entry = self._entries.popitem(last=False)
+			self._totalBytes -= entry.nbytes
+			self.evictions += 1
+			logging.info(f'evicted {key} ({entry.nbytes/CONST_BYTES_PER_MB:.1f}MB) from data source cache')
+
+	def stats(self) -> dict:
+		with self._lock:
+			return {'entries'	: len(self._entries),
+					'bytes'		: self._totalBytes,
+					'maxBytes'	: self.maxBytes,
+					'hits'		: self.hits,
+					'misses'	: self.misses,
+					'stale'		: self.stale,
+					'restored'	: self.restored,
+					'coalesced'	: self.coalesced,
+					'evictions'	: self.evictions}
+
+
+class DataSourceRefresher:
+	"""Keeps registered data sources fresh from a background thread.
+
+	Pages read through get(), which serves the last good copy even once it has
+	expired (stale-while-revalidate) and leaves the fetch to a small worker pool.
+	A daemon thread also refreshes every expired entry on its own ttl, so a source
+	in use is normally refreshed before any page asks for it. Sources that have not
+	been asked for in a while are left to expire and be evicted from the cache.
+	"""
+
+	def __init__(self, cache : DataSourceCache, workers : int = CONST_DEF_REFRESH_WORKERS, poll : float = CONST_DEF_REFRESH_POLL):
+		self.cache		= cache
+		self.poll		= poll
+		self.refreshes	= 0
+		self.failures	= 0
+		self._sources	= {}
+		self._refreshing= set()
+		self._lock		= threading.Lock()
+		self._thread	= None
+		self._pool		= ThreadPoolExecutor(max_workers=workers, thread_name_prefix='datasource-refresh')
+
+	def stats(self) -> dict:
+		with self._lock:
+			return {'sources' : len(self._sources), 'refreshing' : len(self._refreshing), 'refreshes' : self.refreshes, 'failures' : self.failures}
+
+	def register(self, spec : DataSourceSpec, loader) -> None:
+		with self._lock:
+			self._sources[spec.key()] = (spec, loader, time.time())
+			if self._thread is None:
+				self._thread = threading.Thread(target=self._run, name='datasource-refresher', daemon=True)
+				self._thread.start()
+
+	def get(self, spec : DataSourceSpec, loader) -> DataSourceEntry:
+		self.register(spec, loader)
+		return self.cache.get(spec, loader, self.refresh)
+
+	def refresh(self, spec : DataSourceSpec, loader) -> bool:
+		"""Queue a background fetch of spec unless one is already in flight."""
+		key = spec.key()
+		with self._lock:
+			if key in self._refreshing:
+				return False
+			self._refreshing.add(key)
+
+		self._pool.submit(self._refresh, spec, loader)
+		return True
+
+	def _refresh(self, spec : DataSourceSpec, loader) -> None:
+		try:
+			self.cache.load(spec, loader)
+			self.refreshes += 1
+			logging.info(f'refreshed {spec}')
+
+		except Exception as err:
+			self.failures += 1
+			logging.error(f'background refresh of {spec} failed, keeping last good copy - {err}')
+
+		finally:
+			with self._lock:
+				self._refreshing.discard(spec.key())
+
+	def _idle(self, spec : DataSourceSpec, lastUsed : float) -> bool:
+		return time.time()-lastUsed > max(spec.ttl*CONST_DEF_REFRESH_IDLE, CONST_MIN_REFRESH_IDLE)
+
+	def _run(self) -> None:
+		while True:
+			time.sleep(self.poll)
+			with self._lock:
+				sources = list(self._sources.values())
+
+			for spec, loader, lastUsed in sources:
+				entry = self.cache.peek(spec.key())
+				if self.cache.breakers is not None and self.cache.breakers.isOpen(spec.key()):
+					continue
+				if entry is not None and entry.expired() and not self._idle(spec, lastUsed):
+					self.refresh(spec, loader)
+
+
+def frameSize( df ) -> int :
+	try:
+		return int(df.memory_usage(deep=True).sum())
+	except Exception:
+		return 0
+
+
+def _project( df, columns : tuple ):
+	return df if columns is None else df[[col for col in df.columns if col in columns]]
+
+def _readCsv( fHndl, columns : tuple = None, window : tuple = None, **kwargs ):
+	# a callable usecols skips the unwanted columns while parsing and tolerates names the file lacks
+	usecols = None if columns is None else (lambda col : col in columns)
+	if window is None:
+		return pd.read_csv(fHndl, usecols=usecols, **kwargs)
+
+	# through a window the file is parsed a chunk at a time and only the rows in it are kept
+	chunks = [stTransforms.windowRows(chunk, *window) for chunk in pd.read_csv(fHndl, usecols=usecols, chunksize=CONST_WINDOW_CHUNK_ROWS, **kwargs)]
+	return pd.concat(chunks, ignore_index=True) if len(chunks)>0 else pd.DataFrame()
+
+def _readParquet( fHndl, columns : tuple = None, window : tuple = None, **kwargs ):
+	if columns is None and window is None:
+		return pd.read_parquet(fHndl, **kwargs)
+
+	import pyarrow as pa
+	import pyarrow.parquet as pq
+	schema = pq.ParquetFile(fHndl).schema_arrow
+	fHndl.seek(0)
+	if columns is not None:
+		columns = [col for col in columns if col in schema.names]
+	if window is None:
+		return pd.read_parquet(fHndl, columns=columns, **kwargs)
+
+	# a timestamp column takes the window as a filter, row groups whose statistics end before it are
+	# never read and the rest are filtered as they are decoded. Anything else is filtered once read.
+	on, seconds, fmt = window
+	if on not in schema.names or not pa.types.is_timestamp(schema.field(on).type):
+		return stTransforms.windowRows(pd.read_parquet(fHndl, columns=columns, **kwargs), on, seconds, fmt)
+
+	start = stTransforms.windowStart(seconds, schema.field(on).type.tz)
+	return pd.read_parquet(fHndl, columns=columns, filters=[(on, '>=', start)], **kwargs)
+
+def _windowed( df, window : tuple ):
+	return df if window is None else stTransforms.windowRows(df, *window)
+
+def _readJson( fHndl, columns : tuple = None, window : tuple = None, **kwargs ):
+	return _project(_windowed(pd.read_json(fHndl, **kwargs), window), columns)
+
+def _readJsonl( fHndl, columns : tuple = None, window : tuple = None, **kwargs ):
+	return _project(_windowed(pd.read_json(fHndl, lines=True, **kwargs), window), columns)
+
+CONST_READERS				: Final[dict]	= {
+	CONST_FMT_CSV		: ('rt', _readCsv),
+	CONST_FMT_PARQUET	: ('rb', _readParquet),
+	CONST_FMT_JSON		: ('rt', _readJson),
+	CONST_FMT_JSONL		: ('rt', _readJsonl),
+}
+
+
+@performance
+@trace
+def readDataSource( fsys, spec : DataSourceSpec ):
+	"""Read a data source straight from an fsspec filesystem into a typed DataFrame.
+
+	Only spec.columns are read, parquet skips the other column chunks and csv the
+	other fields while parsing. Projected names the source does not have are ignored.
+	With a window only its rows are kept, parquet pushes it down to the row groups
+	and csv filters each chunk as it is parsed. Remote objects are read through the disk cache, which skips the transfer when
+	the object has not changed since the last copy.
+	"""
+	if spec.format not in CONST_READERS:
+		raise ValueError(f'{spec.format} is not a supported data source format, expected one of {list(CONST_READERS)}')
+
+	mode, reader = CONST_READERS[spec.format]
+	kwargs = {'dtype' : spec.dtypes} if spec.format == CONST_FMT_CSV and len(spec.dtypes)>0 else {}
+	kwargs['columns'] = spec.columns
+	kwargs['window'] = None if spec.window is None else spec.window+(spec.datetimes.get(spec.window[0]),)
+	with stDisk.g_diskCache.open(fsys, spec.uri, mode) as fHndl:
+		return applyTypes(reader(fHndl, **kwargs), spec)
+
+@performance
+@trace
+def applyTypes( df, spec : DataSourceSpec ):
+	"""Apply the declared dtypes and datetime formats, the parse happens here once per fetch."""
+	dtypes = {col : dtype for col, dtype in spec.dtypes.items() if col in df and str(df[col].dtype) != dtype}
+	if len(dtypes)>0:
+		df = df.astype(dtypes)
+
+	for col, fmt in spec.datetimes.items():
+		if col not in df:
+			if spec.columns is None or col in spec.columns:
+				logging.warning(f'{spec.id} declares datetime column {col} which is not in the data')
+			continue
+		if not pd.api.types.is_datetime64_any_dtype(df[col]):
+			df[col] = pd.to_datetime(df[col], format=fmt if fmt else None)
+
+	return df
+
+
+class DataSourceHandle:
+	"""A data source the page references, fetched on first use.
+
+	Nothing is read until prefetch() or get() is called. The fetch itself runs on
+	the shared load pool, so several handles can be in flight at once and get()
+	can give up after spec.timeout seconds without the caller hanging on a slow
+	backend.
+
+	When the fetch fails, times out or the source's circuit is open, get() falls
+	back to the last good copy and returns the reason with it. A fetch that timed
+	out keeps running and the next get() waits on that same fetch rather than
+	queueing another behind it, once the circuit is open it does not wait at all.
+	A fetch that failed is retried by the next get(). Handles are shared by every
+	session and build thread, so the reason is handed to the caller rather than
+	kept on the handle.
+	"""
+	__slots__ = ('spec', 'loader', '_future', '_lock')
+
+	def __init__(self, spec : DataSourceSpec, loader):
+		self.spec		= spec
+		self.loader		= loader
+		self._future	= None
+		self._lock		= threading.Lock()
+
+	def _fetch(self) -> DataSourceEntry:
+		return g_refresher.get(self.spec, self.loader)
+
+	def prefetch(self) -> Future:
+		with self._lock:
+			if self._future is None:
+				with g_loadLock:
+					self._future = g_loadPool.submit(self._fetch)
+			return self._future
+
+	def get(self) -> tuple:
+		"""(entry, error), error is None for a current copy and the reason the source is
+		failing when entry is the last good copy. Raises when there is no copy at all."""
+		future = self.prefetch()
+		try:
+			if not future.done() and g_dataCache.breakers is not None and g_dataCache.breakers.rejects(self.spec.key()):
+				raise DataSourceUnavailable(f'{self.spec.id} is failing, not waiting on its fetch - {self.failing()}')
+			entry = future.result(timeout=self.spec.timeout)
+			# a handle can outlive its first fetch (canvas fragments re-read it on their own
+			# interval), so once the copy it fetched expires go back to the refresher.
+			entry = entry if not entry.expired() else g_refresher.get(self.spec, self.loader)
+			# an expired copy is what a failing background refresh leaves behind
+			return entry, (None if not entry.expired() else self.failing())
+
+		except Exception as err:
+			if isinstance(err, TimeoutError) and g_dataCache.breakers is not None:
+				g_dataCache.breakers.failure(self.spec.key(), err)
+			# only a finished fetch is dropped, one still running is waited on again next time
+			with self._lock:
+				if self._future is future and future.done():
+					self._future = None
+
+			entry = g_dataCache.lastGood(self.spec)
+			if entry is None:
+				raise
+			logging.warning(f'{self.spec} unavailable, serving the copy from {entry.age():.0f}s ago - {err}')
+			return entry, err
+
+	def failing(self) -> Exception:
+		"""The error the source's circuit breaker last recorded, None while its fetches succeed."""
+		return None if g_dataCache.breakers is None else g_dataCache.breakers.lastError(self.spec.key())
+
+	def peek(self) -> DataSourceEntry:
+		"""The fetched entry, or None while it has not been asked for, is running or failed."""
+		with self._lock:
+			future = self._future
+		if future is None or not future.done() or future.exception() is not None:
+			return None
+		return future.result()
+
+
+def setLoadWorkers( workers : int ) -> None:
+	global g_loadPool
+	workers = max(1,workers)
+	with g_loadLock:
+		if g_loadPool._max_workers == workers:
+			return
+		old, g_loadPool = g_loadPool, ThreadPoolExecutor(max_workers=workers, thread_name_prefix='datasource-load')
+	# loads already submitted to the old pool still run, only new ones go to the new pool
+	old.shutdown(wait=False)
+
+
+g_fetchSeconds	= vwmetrics.g_metrics.histogram('datasource_fetch_seconds', 'time to read and type a data source')
+g_fetchErrors	= vwmetrics.g_metrics.counter('datasource_fetch_errors_total', 'data source fetches that failed')
+g_breakers	= CircuitBreakers()
+g_dataCache = DataSourceCache(snapshots=stDisk.g_snapshots, breakers=g_breakers)
+g_refresher = DataSourceRefresher(g_dataCache)
+g_loadPool	= ThreadPoolExecutor(max_workers=CONST_DEF_LOAD_WORKERS, thread_name_prefix='datasource-load')
+g_loadLock	= threading.Lock()	# held to submit to g_loadPool or to swap it
+vwmetrics.g_metrics.collector('datasource_cache', g_dataCache.stats)
+vwmetrics.g_metrics.collector('datasource_refresher', g_refresher.stats)
+vwmetrics.g_metrics.collector('datasource_breakers', g_breakers.stats)
+vwmetrics.g_metrics.collector('datasource_disk', stDisk.g_diskCache.stats)
+vwmetrics.g_metrics.collector('datasource_snapshots', stDisk.g_snapshots.stats)
+
+def version() :
+	print(f"{version.__module__}.{version.__name__} {CONST_VER}")
+
+def main() -> int:
+	import fsspec
+	import tempfile
+	import os
+	from fsspec.implementations.local import LocalFileSystem
+
+	class SlowFileSystem(LocalFileSystem):
+		"""Local filesystem that pretends every open is a slow remote GET."""
+		delay = 1.0
+		def _open(self, path, *args, **kwargs):
+			time.sleep(self.delay*(3 if 'slow' in path else 1))
+			return super()._open(path, *args, **kwargs)
+
+	logging.basicConfig(level=logging.INFO)
+	with tempfile.TemporaryDirectory() as tmp:
+		fsys = SlowFileSystem()
+		handles = []
+		for nom in ('a', 'b', 'c', 'slow'):
+			uri = os.path.join(tmp, f'{nom}.csv')
+			pd.DataFrame({'a':range(10), 'b':range(10)}).to_csv(uri, index=False)
+			spec = DataSourceSpec(nom, 'file', uri, CONST_FMT_CSV, 60, timeout=2)
+			handles.append(DataSourceHandle(spec, lambda spec=spec : readDataSource(fsys, spec)))
+
+		s = time.perf_counter()
+		for handle in handles:
+			handle.prefetch()
+		for handle in handles:
+			try:
+				entry, _ = handle.get()
+				logging.info(f'{handle.spec.id} : version {entry.version}, rows {len(entry.df)}')
+			except Exception as err:
+				logging.info(f'{handle.spec.id} : {err!r}')
+		logging.info(f'loaded x{len(handles)} in {time.perf_counter()-s:.2f} seconds')
+		logging.info(g_dataCache.stats())
+	return 0
+# ----------------------------------------------------------------
+# ----------------------------------------------------------------
+# ----------------------------------------------------------------
+version()
+if __name__ == '__main__':
+	main()
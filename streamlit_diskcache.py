@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Final
+from vwlogger import trace
+from vwlogger import performance
+
+CONST_VER					: Final[str]	= '1.0'
+
+CONST_DEF_DISK_PATH			: Final[str]	= './.cache/datasources'
+CONST_DEF_DISK_MB			: Final[int]	= 1024
+CONST_DEF_SNAPSHOT_PATH		: Final[str]	= './.cache/snapshots'
+CONST_DEF_SNAPSHOT_MB		: Final[int]	= 1024
+CONST_SNAPSHOT_EXT			: Final[str]	= '.arrow'
+CONST_BYTES_PER_MB			: Final[int]	= 1024*1024
+CONST_DATA_EXT				: Final[str]	= '.data'
+CONST_META_EXT				: Final[str]	= '.json'
+CONST_TMP_EXT				: Final[str]	= '.tmp'
+CONST_COPY_BUFFER			: Final[int]	= 1024*1024
+# a local path is already as close as it gets, copying it would only double the disk use
+CONST_SKIP_PROTOCOLS		: Final[tuple]	= ('file', 'local')
+# the fields fsspec backends report an object's version under, strongest first
+CONST_ETAG_FIELDS			: Final[tuple]	= ('ETag', 'etag', 'e_tag', 'md5Hash', 'content_md5')
+CONST_MTIME_FIELDS			: Final[tuple]	= ('LastModified', 'last_modified', 'mtime', 'updated', 'created')
+
+
+
+def objectStamp( info : dict ) -> str :
+	"""What identifies this version of a remote object, from fsys.info(): the ETag when the
+	backend has one, else the modification time plus size."""
+	for field in CONST_ETAG_FIELDS:
+		if info.get(field):
+			return f'etag:{info[field]}'
+
+	mtime = next((info[field] for field in CONST_MTIME_FIELDS if info.get(field) is not None), None)
+	return f'mtime:{mtime}:size:{info.get("size")}'
+
+
+class DiskCache:
+	"""Local copies of remote data source objects, kept between runs of the server.
+
+	open() asks the backend for the object's info (a HEAD on S3) and only transfers
+	it when the stamp differs from the local copy's, so TTL expiries and restarts
+	cost a metadata call rather than a download when nothing changed. Copies are
+	keyed by (protocol, uri), the raw object is stored so every projection and
+	typing of it shares the one file.
+
+	Total size is held under maxBytes by dropping the least recently used copies,
+	maxBytes of 0 turns the cache off. Fetches of one object are serialised, so
+	concurrent readers wait for the first transfer and then find the copy current.
+	"""
+
+	def __init__(self, root : str = CONST_DEF_DISK_PATH, maxBytes : int = CONST_DEF_DISK_MB*CONST_BYTES_PER_MB,
+				 skipProtocols : tuple = CONST_SKIP_PROTOCOLS):
+		self.root			= root
+		self.maxBytes		= maxBytes
+		self.skipProtocols	= tuple(skipProtocols)
+		self.hits			= 0
+		self.transfers		= 0
+		self.bytesSaved		= 0
+		self._lock			= threading.Lock()
+		self._objectLocks	= {}
+
+	def configure(self, root : str, maxBytes : int) -> None:
+		with self._lock:
+			self.root		= root
+			self.maxBytes	= maxBytes
+
+	def _objectLock(self, dataPath : str) -> threading.Lock:
+		with self._lock:
+			return self._objectLocks.setdefault(dataPath, threading.Lock())
+
+	def enabled(self, fsys) -> bool:
+		protocols = (fsys.protocol,) if isinstance(fsys.protocol, str) else tuple(fsys.protocol)
+		return self.maxBytes > 0 and not any(p in self.skipProtocols for p in protocols)
+
+	def _paths(self, fsys, uri : str) -> tuple:
+		protocol = fsys.protocol if isinstance(fsys.protocol, str) else fsys.protocol[0]
+		nom = hashlib.sha1(f'{protocol}://{uri}'.encode()).hexdigest()
+		return os.path.join(self.root, nom+CONST_DATA_EXT), os.path.join(self.root, nom+CONST_META_EXT)
+
+	def _localStamp(self, dataPath : str, metaPath : str) -> str:
+		try:
+			with open(metaPath, 'r') as fHndl:
+				meta = json.load(fHndl)
+			return meta['stamp'] if os.path.getsize(dataPath) == meta['size'] else None
+		except (OSError, ValueError, KeyError):
+			return None
+
+	@performance
+	@trace
+	def fetch(self, fsys, uri : str) -> str:
+		"""Path of an up to date local copy of uri, transferring it only if it changed."""
+		dataPath, metaPath = self._paths(fsys, uri)
+		with self._objectLock(dataPath):
+			return self._fetch(fsys, uri, dataPath, metaPath)
+
+	def _fetch(self, fsys, uri : str, dataPath : str, metaPath : str) -> str:
+		info = fsys.info(uri)
+		stamp = objectStamp(info)
+		if self._localStamp(dataPath, metaPath) == stamp:
+			os.utime(metaPath)
+			with self._lock:
+				self.hits += 1
+				self.bytesSaved += os.path.getsize(dataPath)
+			logging.info(f'{uri} unchanged ({stamp}), served from {dataPath}')
+			return dataPath
+
+		os.makedirs(self.root, exist_ok=True)
+		tmpPath = f'{dataPath}.{threading.get_ident()}{CONST_TMP_EXT}'
+		with fsys.open(uri, 'rb') as src, open(tmpPath, 'wb') as dst:
+			shutil.copyfileobj(src, dst, CONST_COPY_BUFFER)
+		os.replace(tmpPath, dataPath)
+		with open(tmpPath, 'w') as fHndl:
+			json.dump({'uri' : uri, 'stamp' : stamp, 'size' : os.path.getsize(dataPath), 'fetchedAt' : time.time()}, fHndl)
+		os.replace(tmpPath, metaPath)
+
+		with self._lock:
+			self.transfers += 1
+		logging.info(f'{uri} transferred ({stamp}) to {dataPath}')
+		self._evict(keep=dataPath)
+		return dataPath
+
+	def open(self, fsys, uri : str, mode : str):
+		"""fsys.open(uri, mode), through the local copy when the cache is on."""
+		if not self.enabled(fsys):
+			return fsys.open(uri, mode)
+		return open(self.fetch(fsys, uri), mode)
+
+	def _evict(self, keep : str) -> None:
+		# the sidecar's mtime is the last use, fetch() touches it on every hit
+		evictOldest(self.root, CONST_DATA_EXT, self.maxBytes, keep, lambda dataPath : dataPath[:-len(CONST_DATA_EXT)]+CONST_META_EXT)
+
+	def stats(self) -> dict:
+		with self._lock:
+			return {'hits' : self.hits, 'transfers' : self.transfers, 'bytesSaved' : self.bytesSaved, 'root' : self.root, 'maxBytes' : self.maxBytes}
+
+
+def evictOldest( root : str, ext : str, maxBytes : int, keep : str, sidecar = None ) -> None:
+	"""Delete the oldest files ending in ext under root until they total maxBytes or less.
+
+	Age is the mtime of sidecar(path) when given (the sidecar goes too), else of
+	the file itself. keep is never deleted.
+	"""
+	files = []
+	for nom in os.listdir(root):
+		if not nom.endswith(ext):
+			continue
+		dataPath = os.path.join(root, nom)
+		paths = (dataPath,) if sidecar is None else (sidecar(dataPath), dataPath)
+		try:
+			files.append((os.path.getmtime(paths[0]), os.path.getsize(dataPath), dataPath, paths))
+		except OSError:
+			continue
+
+	total = sum(f[1] for f in files)
+	for _, size, dataPath, paths in sorted(files):
+		if total <= maxBytes:
+			break
+		if dataPath == keep:
+			continue
+		for path in paths:
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+		total -= size
+		logging.info(f'evicted {dataPath} ({size} bytes) from {root}')
+
+
+class SnapshotStore:
+	"""The last good prepared frame of each data source, saved as uncompressed Arrow IPC
+	(Feather v2) so a restarted server can memory-map it back instead of fetching.
+
+	Files are named after the data source cache key, so a snapshot is only ever
+	restored for the same object read with the same types and columns. The file's
+	mtime is when the frame was fetched, callers use it to decide how stale it is.
+	Saves run on a single background thread, the fetch that produced the frame
+	does not wait for the disk. maxBytes of 0 turns snapshots off.
+	"""
+
+	def __init__(self, root : str = CONST_DEF_SNAPSHOT_PATH, maxBytes : int = CONST_DEF_SNAPSHOT_MB*CONST_BYTES_PER_MB):
+		self.root		= root
+		self.maxBytes	= maxBytes
+		self.saves		= 0
+		self.restores	= 0
+		self.failures	= 0
+		self._lock		= threading.Lock()
+		self._pool		= ThreadPoolExecutor(max_workers=1, thread_name_prefix='datasource-snapshot')
+
+	def configure(self, root : str, maxBytes : int) -> None:
+		with self._lock:
+			self.root		= root
+			self.maxBytes	= maxBytes
+
+	def enabled(self) -> bool:
+		return self.maxBytes > 0
+
+	def path(self, key : tuple) -> str:
+		return os.path.join(self.root, hashlib.sha1(repr(key).encode()).hexdigest()+CONST_SNAPSHOT_EXT)
+
+	def save(self, key : tuple, df, savedAt : float) -> None:
+		"""Queue df to be written as the snapshot for key, stamped savedAt."""
+		if self.enabled():
+			self._pool.submit(self._save, key, df, savedAt)
+
+	def _save(self, key : tuple, df, savedAt : float) -> None:
+		from pyarrow import feather
+		path = self.path(key)
+		tmpPath = f'{path}{CONST_TMP_EXT}'
+		try:
+			os.makedirs(self.root, exist_ok=True)
+			feather.write_feather(df, tmpPath, compression='uncompressed')
+			os.utime(tmpPath, (savedAt, savedAt))
+			os.replace(tmpPath, path)
+			with self._lock:
+				self.saves += 1
+			evictOldest(self.root, CONST_SNAPSHOT_EXT, self.maxBytes, path)
+
+		except Exception as err:
+			with self._lock:
+				self.failures += 1
+			logging.warning(f'snapshot of {key} not saved - {err}')
+
+	@performance
+	@trace
+	def restore(self, key : tuple) -> tuple:
+		"""(df, savedAt) from the snapshot for key, or None when there is no usable one."""
+		path = self.path(key)
+		if not self.enabled() or not os.path.exists(path):
+			return None
+		try:
+			from pyarrow import feather
+			savedAt = os.path.getmtime(path)
+			df = feather.read_table(path, memory_map=True).to_pandas()
+			with self._lock:
+				self.restores += 1
+			logging.info(f'restored snapshot of {key} saved {time.time()-savedAt:.0f} seconds ago')
+			return df, savedAt
+
+		except Exception as err:
+			with self._lock:
+				self.failures += 1
+			logging.warning(f'snapshot {path} of {key} not restored - {err}')
+			return None
+
+	def flush(self) -> None:
+		"""Wait for the queued saves."""
+		self._pool.submit(lambda : None).result()
+
+	def stats(self) -> dict:
+		with self._lock:
+			return {'saves' : self.saves, 'restores' : self.restores, 'failures' : self.failures, 'root' : self.root, 'maxBytes' : self.maxBytes}
+
+
+g_diskCache = DiskCache()
+g_snapshots = SnapshotStore()
+
+def version() :
+	print(f"{version.__module__}.{version.__name__} {CONST_VER}")
+
+def main() -> int:
+	import fsspec
+	import tempfile
+	logging.basicConfig(level=logging.INFO)
+	# the in-memory filesystem stands in for S3, it reports size and created like a remote backend would
+	fsys = fsspec.filesystem('memory')
+	with tempfile.TemporaryDirectory() as tmp:
+		cache = DiskCache(tmp, 1*CONST_BYTES_PER_MB)
+		fsys.pipe('/bucket/a.csv', b'a,b\n1,2\n')
+		for _ in range(3):
+			with cache.open(fsys, '/bucket/a.csv', 'rt') as fHndl:
+				logging.info(fHndl.read().splitlines())
+		fsys.pipe('/bucket/a.csv', b'a,b\n1,2\n3,4\n')
+		with cache.open(fsys, '/bucket/a.csv', 'rt') as fHndl:
+			logging.info(fHndl.read().splitlines())
+		logging.info(cache.stats())
+	return 0
+# ----------------------------------------------------------------
+# ----------------------------------------------------------------
+# ----------------------------------------------------------------
+version()
+if __name__ == '__main__':
+	main()
@@ -1,15 +1,18 @@
 import logging
 import vwlogger
 import json
+import hashlib
+import threading
+import importlib.metadata
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
-import pydeck as pdk
 import numpy as np
 import pandas as pd
+import streamlit_transforms as stTransforms
+import vwmetrics
+import time
 
-from plotly.subplots import make_subplots
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from typing import Final
 from vwlogger import trace
 from vwlogger import performance
@@ -17,12 +20,85 @@ from vwlogger import performance
 CONST_VER 			: Final[str]	= '1.0'
 CONST_UNDEFINED		: Final[str]	= 'undefined'
 BLANK				: Final[str]	= ''
+CONST_FIGCACHE_SIZE	: Final[int]	= 256
+CONST_PAINTER_ENTRY_POINTS	: Final[str]	= 'json2st.painters'	# entry point group third party painters register under
 
 
 
 
+class CanvasOutput:
+	"""Stands in for the streamlit handle during render and records what the painter emits.
+
+	replay() sends the recorded calls to the real handle, so a built figure can be
+	emitted again without running prepare/render.
+	"""
+
+	def __init__(self):
+		self.calls = []
+
+	def __getattr__(self, nom):
+		def record(*args, **kwargs):
+			self.calls.append((nom, args, kwargs))
+		return record
+
+	def replay(self, st_hndl) -> None:
+		for nom, args, kwargs in self.calls:
+			getattr(st_hndl, nom)(*args, **kwargs)
+
+
+class FigureCache:
+	"""LRU cache of rendered canvas output keyed by (canvas config hash, data source version).
+
+	Only the latest data version is kept per canvas, a new version evicts the old
+	output on first sight.
+	"""
+
+	def __init__(self, maxEntries : int = CONST_FIGCACHE_SIZE):
+		self.maxEntries	= maxEntries
+		self.hits		= 0
+		self.misses		= 0
+		self.evictions	= 0
+		self._entries	= OrderedDict()
+		self._lock		= threading.Lock()
+
+	def get(self, key : str, version) -> CanvasOutput:
+		with self._lock:
+			cached = self._entries.get(key)
+			if cached is not None and cached[0] == version:
+				self._entries.move_to_end(key)
+				self.hits += 1
+				return cached[1]
+
+			if cached is not None:
+				del self._entries[key]
+				self.evictions += 1
+			self.misses += 1
+			return None
+
+	def put(self, key : str, version, output : CanvasOutput) -> None:
+		with self._lock:
+			self._entries[key] = (version, output)
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.maxEntries:
+				self._entries.popitem(last=False)
+				self.evictions += 1
+
+	def stats(self) -> dict:
+		with self._lock:
+			return {'entries'	: len(self._entries),
+					'hits'		: self.hits,
+					'misses'	: self.misses,
+					'evictions'	: self.evictions}
+
+
 class CanvasPainter (ABC):
 
+	# painters that do not draw from their inputs alone (random sample data...) set this False
+	cacheable = True
+	# the options whose values name the data columns the painter reads, None when it shows the whole frame
+	columnOptions = None
+	CONST_COMMON_COLUMN_OPTIONS : Final[tuple] = ('sortOnCol',)
+
 	@abstractmethod
 	def render(self, df, st_hndl ) -> bool:
 		pass
@@ -68,31 +144,144 @@ class CanvasPainter (ABC):
 
 	def getY ( self ) -> str:
 		return (self.getOptStr('y',None))
+
+	def requiredColumns ( self ) -> frozenset:
+		"""The columns this canvas reads from its data source, None if it needs all of them."""
+		if self.columnOptions is None:
+			return None
+
+		columns = frozenset(self.configuration[opt] for opt in self.columnOptions+self.CONST_COMMON_COLUMN_OPTIONS
+							if opt in self.configuration and len(str(self.configuration[opt]))>0)
+		window = self.getWindow()
+		if window is not None:
+			columns = columns | frozenset((window[0],))
+		step = self.aggregateStep()
+		if step is None:
+			return columns
+
+		# an aggregated canvas names the aggregate columns, the source has the columns they come from
+		_, on, freq, by, agg, _ = step
+		derived = frozenset(stTransforms.aggregateName(col, func) for col, funcs in agg if len(funcs)>1 for func in funcs)
+		return (columns-derived) | frozenset(by) | frozenset(col for col, _ in agg) | (frozenset((on,)) if freq is not None and on is not None else frozenset())
+
+	def getDownsample ( self ) -> int:
+		return (self.getOptInt('downsample',0))
+
+	def getDownsampleMethod ( self ) -> str:
+		return (self.getOptStr('downsample-method',stTransforms.CONST_DS_DEF_METHOD))
+
+	def getSeries ( self ) -> tuple:
+		"""(x column, [y columns]) the painter plots, x of None means row order."""
+		return (self.getX(), [self.getY()])
+
+	def getWindow ( self ) -> tuple:
+		"""The window option, {"last" : "24h", "on" : "Timestamp_UTC"}, as (on, seconds) or None.
+
+		A malformed window is logged and ignored, the canvas then shows every row.
+		"""
+		try:
+			return (stTransforms.windowSpec(self.configuration.get('window')))
+		except ValueError as err:
+			logging.warning(f"canvas id:{self.configuration.get('id')} - window ignored - {err}")
+			return None
+
+	def getResample ( self ) -> str:
+		return (self.getOptStr('resample',None))
+
+	def getResampleOn ( self ) -> str:
+		"""The datetime column resample bins on, the plotted x unless 'resample-on' names another."""
+		return (self.getOptStr('resample-on',self.getSeries()[0]))
+
+	def getGroupBy ( self ) -> tuple:
+		groupBy = self.configuration.get('groupby',())
+		return tuple(col for col in ((groupBy,) if isinstance(groupBy, str) else groupBy) if len(col)>0)
+
+	def getAgg ( self ) -> tuple:
+		"""The agg option, {column : function name or [names]}, as ((column, (names...)), ...) in column order."""
+		agg = self.configuration.get('agg',{})
+		return tuple(sorted((col, (funcs,) if isinstance(funcs, str) else tuple(funcs)) for col, funcs in agg.items()))
 	
 
-	@performance
-	@trace
-	def trimResultset (self, df ) :
-		max_rows = self.getMaxRows()
-		logging.info(f"trimming resultset, max rows {max_rows}")
-		if( max_rows <= 0):
+	def decimate ( self, df, max_rows : int ) :
+		"""Evenly thin df down to at most max_rows rows, 0 leaves it untouched."""
+		if ( max_rows <= 0 or len(df) <= max_rows):
 			return df
 
-		return df.head(max_rows)
-
-	def sortResultset ( self, df ) :
-		sortCol = self.getSortColumnName ()
-		sortAsc = self.getSortAscending()
+		step = -(-len(df) // max_rows)
+		logging.info(f"decimating resultset of {len(df)} rows, keeping every {step}")
+		return df.iloc[::step]
+
+	def datetimeStep ( self, col : str, fmt : str ) -> tuple:
+		return (stTransforms.CONST_STEP_DATETIME, col, fmt)
+
+	def orderStep ( self ) -> tuple:
+		"""The sortOnCol/sortAscending/head options as a transform step, None when they leave df as is."""
+		sortCol  = self.getSortColumnName()
+		max_rows = max(0, self.getMaxRows())
+		if ( sortCol == None and max_rows == 0):
+			return None
+
+		return (stTransforms.CONST_STEP_ORDER, sortCol, sortCol is not None and self.getSortAscending(), max_rows)
+
+	def windowStep ( self ) -> tuple:
+		"""The window option as a transform step, None without one or when the data source
+		was already read through a window on the same column no wider than it.
+
+		The step is memoised per data version like the others, so the window start is
+		fixed when the frame is first built and only moves on with the next fetch.
+		"""
+		window = self.getWindow()
+		if ( window == None):
+			return None
+		if ( self.sourceWindow != None and self.sourceWindow[0] == window[0] and self.sourceWindow[1] <= window[1]):
+			return None
+
+		return (stTransforms.CONST_STEP_WINDOW,)+window
+
+	def aggregateStep ( self ) -> tuple:
+		"""The resample/groupby/agg options as a transform step, None when there is nothing to group by."""
+		freq = self.getResample()
+		on = None if freq is None else self.getResampleOn()
+		if ( freq != None and on == None):
+			logging.warning(f"canvas id:{self.configuration.get('id')} - resample is ignored without resample-on or an x column")
+			freq = None
+		groupBy = self.getGroupBy()
+		if ( freq == None and len(groupBy) == 0):
+			if len(self.getAgg()) > 0:
+				logging.warning(f"canvas id:{self.configuration.get('id')} - agg is ignored without resample or groupby")
+			return None
+
+		# the columns the painter draws survive the reduction even when agg does not name them
+		keep = tuple(sorted(frozenset(self.configuration[opt] for opt in (self.columnOptions or ())
+									  if opt in self.configuration and len(str(self.configuration[opt]))>0)))
+		return (stTransforms.CONST_STEP_AGGREGATE, on, freq, groupBy, self.getAgg(), keep)
+
+	def downsampleStep ( self ) -> tuple:
+		"""The downsample options as a transform step, None when they are off."""
+		points = self.getDownsample()
+		if ( points <= 0):
+			return None
+
+		xCol, yCols = self.getSeries()
+		return (stTransforms.CONST_STEP_DOWNSAMPLE, xCol, tuple(yCols), points, self.getDownsampleMethod())
 
-		logging.info(f"Sort by {sortCol} ascending:{sortAsc}")
+	@performance
+	@trace
+	def transform ( self, df, *steps ) :
+		"""df put through steps (None entries are skipped) via the shared transform memo.
 
-		if (sortCol == None):
+		Canvases painting the same data version with the same leading steps get the
+		same read only frames, computed once, see stTransforms.applyTransforms.
+		"""
+		if ( df is None):
 			return df
 
-		return (df.sort_values(by=[sortCol],ascending=sortAsc))
+		return stTransforms.applyTransforms(df, self.dataVersion, tuple(step for step in steps if step is not None))
 
-	def __init__ (self, configuration : dict):
+	def __init__ (self, configuration : dict, dataVersion = None):
 		self.configuration = configuration
+		self.dataVersion = dataVersion	# DataSourceEntry.version of the frame being painted, None if unknown
+		self.sourceWindow = None		# (on, seconds) the data source was read through, None for its whole history
 	
 	def __str__(self) :
 		return f'Canvas Painter of Type: {self.__class__}'
@@ -101,8 +290,12 @@ class CanvasPainter (ABC):
 
 
 class BasicGraphPainter( CanvasPainter):
+	columnOptions = ('y',)
+
 	def render(self, df, st_hndl  ):
-		logging.info(self.configuration)
+		import plotly.express as px
+		if vwlogger.debugPayloads():
+			logging.debug(self.configuration)
 		if 'y' not in self.configuration:
 			logging.error(f"canvas id:{self.configuration['id']} - is missing y attribute")
 			st_hndl.write(f'<<Error - See Server Log - Error>>')
@@ -112,8 +305,11 @@ class BasicGraphPainter( CanvasPainter):
 		st_hndl.write(figX)
 		return True
 
+	def getSeries ( self ) -> tuple:
+		return (None, [self.getY()])
+
 	def prepare( self, df ) : 
-		return df
+		return self.transform(df, self.windowStep(), self.aggregateStep(), self.downsampleStep())
 
 class DefaultPainter( CanvasPainter ):
 	def render(self, df, st_hndl ):
@@ -125,6 +321,7 @@ class DefaultPainter( CanvasPainter ):
 
 
 class WindGraphPainter( CanvasPainter ):
+	columnOptions = ('timeStampName', 'windSpeedName', 'windDirectionName')
 
 	def render(self, df, st_hndl ):
 		"""Custom Handler of Name: 'g_wind'
@@ -147,6 +344,14 @@ class WindGraphPainter( CanvasPainter ):
           	"windDirectionLabel": str 	- The Wind Direction label. -> 'Wind Direction'
           	"arrowColor" 		: str 	- The color of the arrows.  -> 'green'
           	"arrowSize" 		: int 	- The size of th wind direction arrows. -> 10 
+          	"maxArrows" 		: int 	- Optional, cap on the number of direction arrows drawn, rows are evenly decimated. -> 200
+          	"downsample"		: int 	- Optional, reduce the wind speed line to about this many points. -> 2000
+          	"downsample-method"	: str 	- Optional, 'minmax' (default) or 'lttb'.
+          	"window"			: dict 	- Optional, only plot the rows of the last period, its start moves on with each fetch. -> {"last" : "24h", "on" : "Timestamp_UTC"}
+          	"resample"			: str 	- Optional, a pandas frequency to average the rows into before they are sorted/trimmed. -> '15min'
+          	"resample-on"		: str 	- Optional, the datetime field resample bins on, defaults to timeStampName.
+          	"groupby"			: str|list - Optional, field(s) to group the rows by, with or without resample.
+          	"agg"				: dict 	- Optional, field -> function name(s) used per group. -> {"Wind Speed (m/s)" : "mean", "Wind Direction_compass points" : "last"}
           	"sortOnCol" 		: str 	- The field name to sort by.  -> 'Timestamp_UTC'
           	"width" 			: int 	- The width of the graph in pixles. -> 1200
           	"height"			: int 	- The hight of the graph in pixles. -> 450
@@ -156,9 +361,9 @@ class WindGraphPainter( CanvasPainter ):
     	bool	:	Returning True if graph is rendered without exception, otherwise False.
 
 	"""
+		import plotly.express as px
+		import plotly.graph_objects as go
 
-
-		DATA_SET 		: Final[int] = 1
 		Y_WIND_SPEED 	: Final[str] = 'windSpeedName'
 		Y_WIND_DIR		: Final[str] = 'windDirectionName'
 		Y_WIND_SPEEDLAB	: Final[str] = 'windSpeedLabel'
@@ -171,6 +376,7 @@ class WindGraphPainter( CanvasPainter ):
 		ARROW_COLOR_DEF : Final[str] = 'red'
 		ARROW_ICON_DEF  : Final[str] = 'arrow'
 		ARROW_SIZE_DEF	: Final[int] = 15
+		MAX_ARROWS		: Final[str] = 'maxArrows'
 		
 		colName_WindSpeed = self.getOptStr(Y_WIND_SPEED)
 		colName_WindSpeedL= self.getOptStr(Y_WIND_SPEEDLAB)
@@ -193,19 +399,21 @@ class WindGraphPainter( CanvasPainter ):
 								colName_WindDir:colName_WindDirL, 
 								colName_Time:colName_TimeL})
 
-		# Add Arrow head to show wind direction.
-		for wind_row in df.iterrows():
-			figX.add_trace(
-				go.Scatter(
-					x=[wind_row[DATA_SET][colName_Time]],
-					y=[wind_row[DATA_SET][colName_WindSpeed]],
-					showlegend=gOpt_Legend,
-					marker=dict(
+		# Add Arrow head to show wind direction. One marker trace for all of the arrows, plotly
+		# takes the per point angle from an array, so the cost no longer grows with a trace per row.
+		arrows = self.decimate(df, self.getOptInt(MAX_ARROWS,0))
+		figX.add_trace(
+			go.Scatter(
+				x=arrows[colName_Time].to_numpy(),
+				y=arrows[colName_WindSpeed].to_numpy(),
+				mode='markers',
+				showlegend=gOpt_Legend,
+				marker=dict(
 					color=arrowColor,
-						size=arrowSize,
-						symbol=ARROW_ICON_DEF,
-						angle=[wind_row[DATA_SET][colName_WindDir]],
-					)))
+					size=arrowSize,
+					symbol=ARROW_ICON_DEF,
+					angle=arrows[colName_WindDir].to_numpy(),
+				)))
 
 
 		# Add figure title
@@ -217,6 +425,9 @@ class WindGraphPainter( CanvasPainter ):
 		st_hndl.write(figX)
 		return True
 
+	def getSeries ( self ) -> tuple:
+		return (self.getOptStr('timeStampName'), [self.getOptStr('windSpeedName')])
+
 	def prepare(self, df) :
 	
 		try:
@@ -228,8 +439,7 @@ class WindGraphPainter( CanvasPainter ):
 			
 			# Apply a format to the date/time field. Otherwise, it will be treated as int64.  Plotty autoformat work so much better
 			# if the data type is defined......
-			df[colName_Time] = pd.to_datetime(df[colName_Time], format=idxDateFormat)
-			return (self.trimResultset(self.sortResultset(df)) )
+			return self.transform(df, self.datetimeStep(colName_Time, idxDateFormat), self.windowStep(), self.aggregateStep(), self.orderStep(), self.downsampleStep())
 
 		except Exception as err:
 			logging.error(f'error was invoking Redox_Ph_GraphPainter.prepare method- {err}')
@@ -238,8 +448,11 @@ class WindGraphPainter( CanvasPainter ):
 
 
 class X2YGraphPainter( CanvasPainter ):
+	columnOptions = ('timeStampName', 'y1', 'y2', 'x')
 
 	def render(self, df, st_hndl ):
+		import plotly.graph_objects as go
+		from plotly.subplots import make_subplots
 		DATA_SET 		: Final[int] = 1
 		X_TIME			: Final[str] = 'timeStampName'
 		X_TIMELAB		: Final[str] = 'timeStampLabel'
@@ -310,6 +523,10 @@ class X2YGraphPainter( CanvasPainter ):
 
 		st_hndl.write(fig)
 		return True
+
+	def getSeries ( self ) -> tuple:
+		return (self.getOptStr('timeStampName'), [self.getOptStr('y1'), self.getOptStr('y2')])
+
 	def prepare(self, df) :
 
 		try:
@@ -320,8 +537,7 @@ class X2YGraphPainter( CanvasPainter ):
 			idxDateFormat = self.getOptStr(IDX_DT_FORMAT)
 			# Apply a format to the date/time field. Otherwise, it will be treated as int64.  Plotty autoformat work so much better
 			# if the data type is defined......
-			df[colName_Time] = pd.to_datetime(df[colName_Time], format=idxDateFormat)
-			return (self.trimResultset(self.sortResultset(df)) )
+			return self.transform(df, self.datetimeStep(colName_Time, idxDateFormat), self.windowStep(), self.aggregateStep(), self.orderStep(), self.downsampleStep())
 
 		except Exception as err:
 			logging.error(f'error was invoking X2YGraphPainter.prepare method- {err}')
@@ -330,6 +546,7 @@ class X2YGraphPainter( CanvasPainter ):
 
 
 class VoltageGraphPainter( CanvasPainter ):
+	columnOptions = ('x', 'y')
 
 	def render(self, df, st_hndl ):
 		"""Custom Handler of Name: 'g_voltage'
@@ -359,11 +576,14 @@ class VoltageGraphPainter( CanvasPainter ):
           	"control-line-txt-pos"  	: "bottom right",
           	"control-line-txt-size" 	: 10,
           	"control-line-txt-color" 	: "red"
+          	"downsample"				: 2000 - Optional, reduce the line to about this many points.
+          	"downsample-method"			: "minmax" (default) or "lttb"
 
     Returns:
     	bool	:	Returning True if graph is rendered without exception, otherwise False.
 
 	"""
+		import plotly.express as px
 		figX = px.line(df, 
 					y=[self.getY()],
 					x=self.getX(),
@@ -385,11 +605,15 @@ class VoltageGraphPainter( CanvasPainter ):
 		return True
 
 	def prepare(self, df) :
-		return (self.trimResultset(self.sortResultset(df)) )
+		return self.transform(df, self.windowStep(), self.aggregateStep(), self.orderStep(), self.downsampleStep())
 
 
 class GeoRandomPainter( CanvasPainter ):
+	cacheable = False
+	columnOptions = ()
+
 	def render(self, df, st_hndl ):
+		import pydeck as pdk
 		#54.991221, -2.360183
 		chart_data = pd.DataFrame(
 						np.random.randn(1000, 2) / [50, 50] + [54.991221, 2.360183],
@@ -431,6 +655,9 @@ class GeoRandomPainter( CanvasPainter ):
 
 
 class GeoSampleRandomPainter( CanvasPainter ):
+	cacheable = False
+	columnOptions = ()
+
 	def render(self, df, st_hndl ):
 		#54.991221, -2.360183
 		#ignore the data frame passed in, just generate random data
@@ -445,9 +672,58 @@ class GeoSampleRandomPainter( CanvasPainter ):
 		return df
 
 
+class PerfStatsPainter( CanvasPainter ):
+	"""Custom Handler of Name: 'perf_stats', the process's own metrics as tables.
+
+    JSON Configurartion:
+    	Canvas":
+          	"id"				: str 	- unique name
+         	"handler"			: str   - 'perf_stats'
+          	"head"				: int 	- Optional, the slowest functions to list by total time. -> 15
+          	"refresh"			: int 	- Optional, redraw every n milliseconds. -> 5000
+	"""
+	cacheable = False
+	columnOptions = ()
+	CONST_DEF_TOP : Final[int] = 15
+
+	def _latencies(self, histogram, labelName : str) -> pd.DataFrame:
+		rows = []
+		for labels, summary in histogram.summary().items():
+			labels = dict(labels)
+			rows.append({labelName	: ' '.join(str(labels[k]) for k in sorted(labels)),
+						 'calls'	: summary['count'],
+						 'total s'	: round(summary['sum'], 3),
+						 'mean ms'	: round(summary['mean']*1000, 1),
+						 'p95 ms <=': summary['p95']*1000})
+		return pd.DataFrame(rows, columns=[labelName, 'calls', 'total s', 'mean ms', 'p95 ms <='])
+
+	def render(self, df, st_hndl ):
+		top = self.getOptInt('head', self.CONST_DEF_TOP) or self.CONST_DEF_TOP
+		functions = self._latencies(vwlogger.g_functionSeconds, 'function').sort_values('total s', ascending=False, kind='stable').head(top)
+		st_hndl.caption('functions')
+		st_hndl.dataframe(functions, hide_index=True)
+		st_hndl.caption('canvases')
+		st_hndl.dataframe(self._latencies(g_canvasSeconds, 'canvas'), hide_index=True)
+		st_hndl.caption('data source fetches')
+		# the data layer registers this histogram, asking the registry for it by name returns that one
+		st_hndl.dataframe(self._latencies(vwmetrics.g_metrics.histogram('datasource_fetch_seconds'), 'source'), hide_index=True)
+		st_hndl.caption('caches')
+		st_hndl.dataframe(pd.DataFrame([{'component' : nom, 'stat' : key, 'value' : val}
+										for nom, stats in vwmetrics.g_metrics.collected().items() for key, val in stats.items()],
+									   columns=['component', 'stat', 'value']), hide_index=True)
+		return True
+
+	def prepare( self, df):
+		return df
+
+
 class GuageSampleRandomPainter( CanvasPainter ):
+	cacheable = False
+	columnOptions = ()
+
 	#https://plotly.com/python/reference/indicator/
 	def render(self, df, st_hndl ):
+		import plotly.graph_objects as go
 		fig = go.Figure(go.Indicator(
 		    mode = "gauge+number+delta",
 		    value = 420,
@@ -497,52 +773,145 @@ class GuageSampleRandomPainter( CanvasPainter ):
 	def prepare( self, df):
 		return df
 
+# handler name -> CanvasPainter subclass, a painter is only instantiated for the canvas that asks for it
+g_painters = {
+	'default'			: DefaultPainter,
+	'default_graph'		: BasicGraphPainter,
+	'g_voltage'			: VoltageGraphPainter,
+	'g_wind'			: WindGraphPainter,
+	'georandom'			: GeoRandomPainter,
+	'geosimplerando'	: GeoSampleRandomPainter,
+	'guageSamplerando'	: GuageSampleRandomPainter,
+	'x2y_graph'			: X2YGraphPainter,
+	'perf_stats'		: PerfStatsPainter,
+}
+g_entryPointsLoaded	= False
+g_painterLock		= threading.Lock()
+
+def registerPainter( painterName : str, painterClass, overwrite : bool = False ) -> bool:
+	"""Make painterClass (a CanvasPainter subclass) available as handler painterName."""
+	with g_painterLock:
+		if painterName in g_painters and not overwrite:
+			logging.warning(f"duplicate painter name {painterName}, {painterClass} not registered")
+			return False
+		g_painters[painterName] = painterClass
+		return True
+
+def _loadPainterEntryPoints() -> None:
+	"""Register the painters installed packages declare under CONST_PAINTER_ENTRY_POINTS, once.
+
+	An entry point's name is the handler name and it loads to the painter class,
+	built-in names are not replaced.
+	"""
+	global g_entryPointsLoaded
+	with g_painterLock:
+		if g_entryPointsLoaded:
+			return
+		g_entryPointsLoaded = True
+
+	for entryPoint in importlib.metadata.entry_points(group=CONST_PAINTER_ENTRY_POINTS):
+		try:
+			registerPainter(entryPoint.name, entryPoint.load())
+			logging.info(f"painter {entryPoint.name} registered from {entryPoint.value}")
+		except Exception as err:
+			logging.error(f"painter {entryPoint.name} from {entryPoint.value} not loaded - {err}")
+
 @performance
 @trace
 def canvasPainterFactory ( painterName : str, configuration : dict ) -> CanvasPainter:
 
-	availablePainters = {
-		'default': DefaultPainter(configuration),
-		'default_graph' : BasicGraphPainter(configuration),
-		'g_voltage' : VoltageGraphPainter(configuration),
-		'g_wind' : WindGraphPainter(configuration),
-		'georandom' : GeoRandomPainter(configuration),
-		'geosimplerando' : GeoSampleRandomPainter(configuration),
-		'guageSamplerando' : GuageSampleRandomPainter(configuration),
-		'x2y_graph' : X2YGraphPainter(configuration),
-	}
-
-	if painterName in availablePainters:
+	if painterName not in g_painters and not g_entryPointsLoaded:
+		_loadPainterEntryPoints()
+
+	painterClass = g_painters.get(painterName)
+	if painterClass is not None:
 		logging.info(f"Painter of type {painterName} located in list of availablePainters")
-		return availablePainters[painterName]
+		return painterClass(configuration)
 
 	logging.warning(f"Painter Class not found in list of availablePainters, default choosen")
-	return availablePainters['default']
+	return DefaultPainter(configuration)
 
 
 def version() : 
 	print(f"{version.__module__}.{version.__name__} {CONST_VER}")
 
+def canvasColumns( canvas : dict ) -> frozenset :
+	"""Columns a canvas config reads from its data source, None for all of them."""
+	return canvasPainterFactory(canvas.get('handler',CONST_UNDEFINED), canvas).requiredColumns()
+
+def canvasWindow( canvas : dict ) -> tuple :
+	"""The (on, seconds) window a canvas config shows, None for all of its rows."""
+	return canvasPainterFactory(canvas.get('handler',CONST_UNDEFINED), canvas).getWindow()
+
+def canvasHash( canvas : dict ) -> str :
+	return hashlib.sha1(json.dumps(dict(canvas), sort_keys=True, default=str).encode()).hexdigest()
+
 @performance
 @trace
-def stCanvasHandler( canvas : dict, df ) ->bool:
+def buildCanvas( canvas : dict, df, version = None, sourceWindow : tuple = None ) -> CanvasOutput:
+	"""Prepare and render a canvas into a CanvasOutput, or fetch its cached output.
+
+	Nothing is sent to streamlit here, so canvases can be built on worker threads
+	and emitted later with output.replay(st). version identifies the copy of the
+	data in df (DataSourceEntry.version), the output is reused while neither it
+	nor the canvas config change, data with no version is never cached. Returns None
+	when the painter raised.
+	sourceWindow is the window the data source was read through (DataSourcePlan.window),
+	a canvas window it already covers is not applied a second time.
+	"""
 	
-	logging.info(f"NEW Factory {canvas}")
+	logging.info("NEW Factory %s", canvas.get('id'))
+	if vwlogger.debugPayloads():
+		logging.debug(canvas)
+	vwlogger.spanTag(canvas=canvas.get('id'), handler=canvas.get('handler'), dataVersion=version)
 
+	s = time.perf_counter()
+	labels = {'canvas' : canvas.get('id'), 'handler' : canvas.get('handler')}
 	try:
 		painter = canvasPainterFactory( canvas['handler'],canvas )
+		painter.dataVersion = version
+		painter.sourceWindow = sourceWindow
 		logging.info(str(painter))
+
+		# without a version two different frames would share the output
+		key = canvasHash(canvas) if painter.cacheable and (df is None or version is not None) else None
+		output = None if key is None else g_figureCache.get(key, version)
+		if output is not None:
+			logging.info(f"canvas {canvas.get('id')} served from figure cache, version {version}")
+			g_canvasSeconds.observe(time.perf_counter()-s, outcome='cached', **labels)
+			return output
+
 		df = painter.prepare(df)
-		logging.info(df.dtypes)
-		logging.info(df)
-		painter.render(df, st)
-		return True
+		if vwlogger.debugPayloads():
+			logging.debug(df.dtypes)
+			logging.debug(df)
+		output = CanvasOutput()
+		bRendered = painter.render(df, output)
+		if key is not None and bRendered:
+			g_figureCache.put(key, version, output)
+		g_canvasSeconds.observe(time.perf_counter()-s, outcome='rendered', **labels)
+		return output
 	except Exception as err:
 		logging.error(f'error was invoking canvas handler - {err}')
+		g_canvasSeconds.observe(time.perf_counter()-s, outcome='error', **labels)
+		return None
+
+def stCanvasHandler( canvas : dict, df, version = None, sourceWindow : tuple = None ) ->bool:
+	"""Build a canvas and emit it straight away."""
+	output = buildCanvas(canvas, df, version, sourceWindow)
+	if output is None:
 		return False
+	output.replay(st)
+	return True
+
+g_figureCache = FigureCache()
+g_canvasSeconds = vwmetrics.g_metrics.histogram('canvas_seconds', 'time to draw a canvas, by outcome (rendered, cached, error)')
+vwmetrics.g_metrics.collector('figure_cache', g_figureCache.stats)
+vwmetrics.g_metrics.collector('transform_memo', stTransforms.g_transformMemo.stats)
+vwmetrics.g_metrics.collector('logging', vwlogger.loggingStats)
 
 def main() -> int:
-	logging.basicConfig(level=vwlogger.CONST_DEF_LOGLEVEL,format=vwlogger.CONST_LOGGING_FMT)
+	vwlogger.setupLogging()
 	painter = canvasPainterFactory('default', None)
 	logging.info(f'{str(painter)}')
 	painter = canvasPainterFactory('default_graph', None)
@@ -11,11 +11,19 @@ import logging
 import streamlit as st
 import vwlogger
 import base64
+import time
+import os
+import functools
+import threading
 
 from vwlogger import trace
 from vwlogger import performance
 from typing import Final
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from streamlit_handlers import stCanvasHandler
+from streamlit_handlers import buildCanvas
 
 CONST_VER                   	: Final[str]  = '1.7'
 
@@ -45,6 +53,12 @@ CONST_CFG_APP_SIDEBAR_DEF		:Final[str] = 'small'
 CONST_CFG_APP_GAP_DEF			:Final[str] = 'small'
 CONST_CFG_APP_HAMBURGER			:Final[str] = 'hamburger'
 CONST_CFG_APP_BGIMG				:Final[str] = 'bg-img'
+CONST_CFG_APP_RESOURCES			:Final[str] = 'Resources'
+CONST_CFG_APP_DATASOURCES		:Final[str] = 'DataSources'
+CONST_CFG_APP_CANVAS			:Final[str] = 'Canvas'
+CONST_CFG_APP_CANVAS_REF		:Final[str] = 'canvas'
+CONST_CFG_APP_DATASOURCE_REF	:Final[str] = 'data-source'
+CONST_CFG_APP_CANVAS_REFRESH	:Final[str] = 'refresh'
 
 CONST_CFG_NOTDEFINED 			:Final[str] = "** NOT DEFINED **"
 CONST_CFG_BLANK 				:Final[str] = ""
@@ -57,13 +71,24 @@ CONST_ST_MENUITEM_ABOUT			:Final[str] = "About"
 CONST_CFG_NONE 					:Final[str] = ""
 CONST_ERROR_STR					:Final[str] = "!!Exception!!"
 CONST_WARN_STR					:Final[str] = "--WARNING--"
+CONST_STATIC_CACHE_SIZE			:Final[int] = 32
+CONST_STALE_BADGE				:Final[str] = ":orange[source unavailable] - showing data as of {asOf} ({age:.0f}s old)"
+CONST_DEF_BUILD_WORKERS			:Final[int] = 4
+CONST_SESSION_DATASOURCES		:Final[str] = 'dataSources'
+
+# st.fragment arrived in streamlit 1.37 (1.33 as experimental_fragment), without it a canvas
+# refresh interval is ignored and the canvas only updates with the page.
+CONST_ST_FRAGMENT 				= getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
 CONST_CFG_APP_SIDEBAR_DEF
 
 
 
-g_dataSources = {}
-g_canvasResource={}
+g_dataSources = {}	# DataSourceSpec.key() -> DataSourceHandle, the page's ids map to these through the session
 g_init = 0
+g_buildPool = ThreadPoolExecutor(max_workers=CONST_DEF_BUILD_WORKERS, thread_name_prefix='canvas-build')
+g_buildLock = threading.Lock()	# held to submit to g_buildPool or to swap it
+# canvas id -> Future of (output, entry) for the current script run, see uxPrepareCanvases
+g_prebuilt = threading.local()
 
 def version() : 
 	print(f"{version.__module__}.{version.__name__}:{CONST_VER}")
@@ -71,12 +96,28 @@ def version() :
 
 import base64
 
+def fileStamp( path : str ) -> tuple :
+	fStat = os.stat(path)
+	return (fStat.st_mtime_ns, fStat.st_size)
+
+# static page assets are read (and encoded) once per file version, not on every rerun.
+@functools.lru_cache(maxsize=CONST_STATIC_CACHE_SIZE)
+def _readStaticFile( path : str, stamp : tuple ) -> str:
+	with open(path) as f:
+		return f.read()
+
+@functools.lru_cache(maxsize=CONST_STATIC_CACHE_SIZE)
+def _base64StaticFile( path : str, stamp : tuple ) -> str:
+	with open(path, 'rb') as f:
+		return base64.b64encode(f.read()).decode()
+
+def readStaticFile( path : str ) -> str:
+	return _readStaticFile(path, fileStamp(path))
+
 @performance
 @trace
 def get_base64_of_bin_file(bin_file):
-    with open(bin_file, 'rb') as f:
-        data = f.read()
-    return base64.b64encode(data).decode()
+    return _base64StaticFile(bin_file, fileStamp(bin_file))
 
 def set_bg_url( uri ):
     '''
@@ -124,10 +165,10 @@ def disable_hamburger() :
 
 @performance
 @trace
-def addDataSource( name : str , val ) -> bool :
+def addDataSource( name : str , val, overwrite : bool = False ) -> bool :
 	try:
 
-		if name in g_dataSources:
+		if name in g_dataSources and not overwrite:
 			logging.warning(f"duplicate name by {name} in data source dict...")
 			return False
 
@@ -138,141 +179,70 @@ def addDataSource( name : str , val ) -> bool :
 		logging.error(f"{err} - name:{name}")
 		return False
 
+def usePageDataSources( keys : dict ) -> None:
+	"""Point this session's data source ids at the registered handles, keys maps id -> spec key.
 
+	The same id can need a different spec (columns, window) on each page, so the
+	mapping is held per session rather than in g_dataSources.
+	"""
+	st.session_state[CONST_SESSION_DATASOURCES] = dict(keys)
 
-@performance
-@trace
-def addCanvasResource( name : str , val ) -> bool :
-	try:
-		
-		if name in g_canvasResource:
-			logging.warning(f"duplicate name by {name} in canvas resource dict...")
-			return False
+def pageDataSource( id : str ) :
+	"""The handle behind data source id on the current page, None if the page did not register it."""
+	key = st.session_state.get(CONST_SESSION_DATASOURCES, {}).get(id)
+	return None if key is None else g_dataSources.get(key)
 
-		g_canvasResource[name] = val
-		return True
-	
-	except Exception as err:
-		logging.error(f"{err} - name:{name}")
-		return False
 
 
 @performance
 @trace
-def appOptions( configuration : dict, e : str,default=CONST_CFG_NONE, lang : str =  CONST_CFG_APP_LANG) -> str: 
-	try:
-	
-	   return configuration[lang][e]
-	
-	except Exception as err:
-		logging.warning(f"lang:{lang} element:{e} default: {default} applied --reason:{err}")
-		return default
-
-@performance
-@trace
-def siteOptions( configuration : dict, e : str,default=CONST_CFG_NONE, lang : str =  CONST_CFG_APP_LANG) -> str:
-	try:
-	
-		return configuration[lang][CONST_CFG_APP_SITE][e]
-	
-	except Exception as err:
-		logging.warning(f"lang:{lang} element:{e} default: {default} applied --reason:{err}")
-		return default
-
-@performance
-@trace
-def columnOptions ( configuration : dict, e : str, idx = 0, default=CONST_CFG_NONE, lang : str = CONST_CFG_APP_LANG) -> str:
-	try:
-	
-		return configuration[lang][CONST_CFG_APP_SITE][CONST_CFG_APP_COLS][idx][e]
-	
-	except Exception as err:
-		logging.warning(f"lang:{lang} idx:{idx} element:{e} default: {default} applied --reason:{err}")
-		return default
-
-@performance
-@trace
-def rowOptions ( configuration : dict, e : str, colIdx = 0, idx=0, default=CONST_CFG_NONE, lang : str = CONST_CFG_APP_LANG) -> str:
-	try:
-	
-		return configuration[lang][CONST_CFG_APP_SITE][CONST_CFG_APP_COLS][colIdx][CONST_CFG_APP_ROWS][idx][e]
-	
-	except Exception as err:
-		logging.warning(f"lang:{lang} colIdx:{colIdx} rowIdx:{idx} element:{e} default: {default} applied --reason:{err}")
-		return default
-
-@performance
-@trace
-def containerOptions ( configuration : dict, e : str, colIdx = 0, rIdx=0, idx=0, default=CONST_CFG_NONE, lang : str = CONST_CFG_APP_LANG) -> str:
-	try:
-	
-		return configuration[lang][CONST_CFG_APP_SITE][CONST_CFG_APP_COLS][colIdx][CONST_CFG_APP_ROWS][rIdx][CONST_CFG_APP_CONTAINERS][idx][e]
-	
-	except Exception as err:
-		logging.warning(f"lang:{lang} colIdx:{colIdx} rowIdx:{rIdx} containerIdx:{idx} element:{e} default: {default} applied --reason:{err}")
-		return default
-
-@performance
-@trace
-def uxInit( configuration : dict ) -> bool :
+def uxInit( plan ) -> bool :
 	try:
 
 		options     = {}
-		menuItems   = {}
-		title 	 	= appOptions(configuration,CONST_CFG_APP_TITLE)
-		pageTitle	= appOptions(configuration,'pageTitle') #FIX const ref
-		layout   	= appOptions(configuration,CONST_CFG_APP_LAYOUT)
-		pgIcon   	= appOptions(configuration,CONST_CFG_APP_PAGEICON)
-		sideBarState= appOptions(configuration,CONST_CFG_APP_INITIALSIDEBAR,CONST_CFG_APP_SIDEBAR_DEF)
-		hamburger 	= appOptions(configuration,CONST_CFG_APP_HAMBURGER)
-		bgImg       = appOptions(configuration,CONST_CFG_APP_BGIMG)
-		style    	= appOptions(configuration,CONST_CFG_APP_CSS,CONST_CFG_BLANK)
-		
 		
-		if ( len(pageTitle)>0 ) :
-			options['page_title']=pageTitle  #FIX const ref
+		if ( len(plan.pageTitle)>0 ) :
+			options['page_title']=plan.pageTitle  #FIX const ref
 		
-		if ( len(layout)>0):
-			options['layout']=layout  #FIX const ref
+		if ( len(plan.layout)>0):
+			options['layout']=plan.layout  #FIX const ref
 
-		if ( len(pgIcon)>0):
-			options['page_icon']=pgIcon  #FIX const ref
+		if ( len(plan.pageIcon)>0):
+			options['page_icon']=plan.pageIcon  #FIX const ref
 		
-		if ( len(sideBarState)>0):
-			options['initial_sidebar_state']=sideBarState  #FIX const ref
+		if ( len(plan.sidebarState)>0):
+			options['initial_sidebar_state']=plan.sidebarState  #FIX const ref
 
 
 		
 		#hide_header()
-		#if ( hamburger):
+		#if ( plan.hamburger):
 		#	disable_hamburger()
 
 
 		st.set_page_config(**options,
 							menu_items={
-							 CONST_ST_MENUITEM_GETHELP 	 : appOptions(configuration,CONST_CFG_APP_MI_SUPPORT,CONST_CFG_NOTDEFINED),
-							 CONST_ST_MENUITEM_REPORTBUG : appOptions(configuration,CONST_CFG_APP_MI_SUPPORT,CONST_CFG_NOTDEFINED),
-							 CONST_ST_MENUITEM_ABOUT 	 : appOptions(configuration,CONST_CFG_APP_MI_ABOUT,CONST_CFG_NOTDEFINED),
+							 CONST_ST_MENUITEM_GETHELP 	 : plan.helpUrl,
+							 CONST_ST_MENUITEM_REPORTBUG : plan.helpUrl,
+							 CONST_ST_MENUITEM_ABOUT 	 : plan.about,
 						   })
 		
-		if ( len(title)>0 ) :
-			st.title(title)
+		if ( len(plan.title)>0 ) :
+			st.title(plan.title)
 
-		if ( len(bgImg)>0) :
-			set_bg_url(bgImg)
+		if ( len(plan.bgImg)>0) :
+			set_bg_url(plan.bgImg)
 
-		if (style != CONST_CFG_BLANK) : 
-			logging.warning(f'Appending Custom Style sheet {style} to Streamlit App')
-			with open( style ) as css:
-				st.markdown( f'<style>{css.read()}</style>' , unsafe_allow_html= True)
-			logging.infor(f'Style sheet {style} applied')
+		if (plan.css != CONST_CFG_BLANK) : 
+			logging.warning(f'Appending Custom Style sheet {plan.css} to Streamlit App')
+			st.markdown( f'<style>{readStaticFile(plan.css)}</style>' , unsafe_allow_html= True)
+			logging.info(f'Style sheet {plan.css} applied')
 
 
-		subHeader = appOptions(configuration,CONST_CFG_APP_SUBTITLE)
-		if ( len(subHeader)>0 ) :
-			st.subheader(subHeader)
+		if ( len(plan.subheader)>0 ) :
+			st.subheader(plan.subheader)
 
-		logging.info(f'init {title} - {subHeader}')
+		logging.info(f'init {plan.title} - {plan.subheader}')
 
 	except Exception as err:
 		logging.error(f'{err}')
@@ -280,18 +250,18 @@ def uxInit( configuration : dict ) -> bool :
 
 @performance
 @trace
-def uxSidebar(configuration : dict) -> bool:
+def uxSidebar( plan ) -> bool:
 	bRet = False
-	if ( CONST_CFG_APP_SIDEBAR not in configuration[CONST_CFG_APP_LANG][CONST_CFG_APP_SITE]):
+	if ( plan.sidebar is None):
 		logging.warning(f'Sidebar configuration not defined, skipping processing of sidebar')
 		return bRet
 
 	try:
 
 		with st.sidebar:
-			st.sidebar.header(siteOptions(configuration,CONST_CFG_APP_SIDEBAR,CONST_CFG_NOTDEFINED)[CONST_CFG_APP_TITLE])
-			for sbContent in siteOptions(configuration,CONST_CFG_APP_SIDEBAR)[CONST_CFG_APP_SIDEBAR_CONTENTS]:
-				st.write(sbContent[CONST_CFG_APP_CONTAINERS_TXT])
+			st.sidebar.header(plan.sidebar.title)
+			for sbContent in plan.sidebar.contents:
+				st.write(sbContent)
 
 		bRet = True
 
@@ -304,21 +274,141 @@ def uxSidebar(configuration : dict) -> bool:
 
 @performance
 @trace
-def uxCanvas( configuration : dict) -> bool:
+def uxCanvas( container ) -> bool:
 	try:
 
-		if ( 'canvas' not in configuration):
-			logging.warning(f"skipping the canvas render for container id: {configuration['id']}")
+		if ( container.canvas is None):
+			logging.warning(f"skipping the canvas render for container id: {container.id}")
 			return False
 
-		canvas=g_canvasResource[configuration['canvas']];
-		logging.info(f"loaded canvas {configuration['canvas']} : {canvas}")
+		canvas=container.canvas
+		logging.info("loaded canvas %s", canvas.id)
+		if vwlogger.debugPayloads():
+			logging.debug(canvas.configuration)
+
+		# a canvas with its own refresh interval is drawn as a fragment, streamlit reruns just
+		# that fragment on the interval and the rest of the page is left alone.
+		if canvas.refresh > 0 and CONST_ST_FRAGMENT is not None:
+			CONST_ST_FRAGMENT(uxCanvasContents, run_every=timedelta(milliseconds=canvas.refresh))(canvas)
+			return True
+
+		return uxCanvasContents(canvas)
+
+	except Exception as err:
+		logging.error(err)
+		return False
+
+@performance
+@trace
+def uxCanvasContents( canvas ) -> bool:
+	vwlogger.spanTag(canvas=canvas.id)
+	try:
+		# built ahead by uxPrepareCanvases, only once - a fragment rerun builds afresh
+		prebuilt = getattr(g_prebuilt, 'futures', {}).pop(canvas.id, None)
+		if prebuilt is not None:
+			output, stale = prebuilt.result()
+			if stale is not None:
+				uxStaleBadge(stale)
+			if output is None:
+				return False
+			output.replay(st)
+			return True
 
 		df=None
-		if 'data-source' in canvas and len(canvas['data-source'])>0:  #FIX const ref
-			df=g_dataSources[canvas['data-source']]  #FIX const ref
+		version=None
+		if canvas.dataSource is not None:
+			handle=pageDataSource(canvas.dataSource.id)
+			if handle is None:
+				raise KeyError(f'data source {canvas.dataSource.id} is not registered for this page')
+			entry,error=handle.get()
+			df,version=entry.view(),entry.version
+			if error is not None:
+				uxStaleBadge(entry)
 			
-		stCanvasHandler(canvas,df)
+		return stCanvasHandler(canvas.configuration,df,version,None if canvas.dataSource is None else canvas.dataSource.window)
+
+	except Exception as err:
+		logging.error(err)
+		return False
+
+def _buildCanvas( canvas, handle, ctx ) -> tuple:
+	"""(output, entry to badge as stale or None) for canvas drawn from handle, run on the build pool."""
+	# the run's context lets the spans of this build carry the session id
+	if ctx is not None:
+		add_script_run_ctx(threading.current_thread(), ctx)
+	df=None
+	version=None
+	stale=None
+	if handle is not None:
+		entry,error=handle.get()
+		df,version=entry.view(),entry.version
+		if error is not None:
+			stale=entry
+	return buildCanvas(canvas.configuration,df,version,None if canvas.dataSource is None else canvas.dataSource.window), stale
+
+def setBuildWorkers( workers : int ) -> None:
+	"""Resize the pool canvases are built on ahead of the render."""
+	global g_buildPool
+	workers = max(1, workers)
+	with g_buildLock:
+		if workers == g_buildPool._max_workers:
+			return
+		old, g_buildPool = g_buildPool, ThreadPoolExecutor(max_workers=workers, thread_name_prefix='canvas-build')
+	# builds already submitted to the old pool still run, only new ones go to the new pool
+	old.shutdown(wait=False)
+
+def uxDiscardPrebuilt() -> int:
+	"""Drop the builds of this run that were never replayed (a skipped container, an
+	interrupted render), cancelling those that have not started. Returns how many."""
+	futures = getattr(g_prebuilt, 'futures', {})
+	g_prebuilt.futures = {}
+	for future in futures.values():
+		future.cancel()
+	if len(futures)>0:
+		logging.info(f'{len(futures)} prebuilt canvases were not rendered - {list(futures)}')
+	return len(futures)
+
+@performance
+@trace
+def uxPrepareCanvases( plan ) -> int:
+	"""Start preparing and building every canvas on the page concurrently.
+
+	Only the CanvasOutput is built on the pool, nothing reaches streamlit there.
+	The render then walks the layout as before and uxCanvasContents replays each
+	output in place, waiting for it if it is still building, so the page is
+	emitted in layout order. Canvases with a refresh interval are left to their
+	fragment. Returns the number of builds started, call uxDiscardPrebuilt once
+	the render is done.
+	"""
+	uxDiscardPrebuilt()
+	futures = {}
+	try:
+		ctx = get_script_run_ctx()
+		for container in plan.renderOrder():
+			canvas = container.canvas
+			if canvas is None or canvas.id in futures or (canvas.refresh > 0 and CONST_ST_FRAGMENT is not None):
+				continue
+			# resolved here, the session is not reachable from the pool
+			handle = None if canvas.dataSource is None else pageDataSource(canvas.dataSource.id)
+			if canvas.dataSource is not None and handle is None:
+				continue	# left to uxCanvasContents, which reports it
+			if handle is not None:
+				handle.prefetch()
+			with g_buildLock:
+				futures[canvas.id] = g_buildPool.submit(_buildCanvas, canvas, handle, ctx)
+
+	except Exception as err:
+		logging.error(err)
+
+	finally:
+		g_prebuilt.futures = futures
+		logging.info(f'{len(futures)} canvases building on {g_buildPool._max_workers} workers')
+		return len(futures)
+
+def uxStaleBadge( entry ) -> bool:
+	"""Mark a canvas drawn from the last good copy because its source is failing."""
+	try:
+		st.caption(CONST_STALE_BADGE.format(asOf=time.strftime("%H:%M:%S", time.localtime(entry.loadedAt)), age=entry.age()))
 		return True
 
 	except Exception as err:
@@ -327,31 +417,50 @@ def uxCanvas( configuration : dict) -> bool:
 
 
 
-#hack - we want to reuse the func' for any container so we pass in the json relitive to the 'Containers'
-# but we now want each container to reference a resource which are stored under 'Site. So, bit of a hack, but
-# we get both passed in :( 
 @performance
 @trace
-def uxContainer( fullConfiguration : dict, configuration : dict) -> dict :
+def uxDataFreshness( plan ) -> bool:
+	"""Caption the page with the age of the oldest data source it uses."""
+	try:
+		handles = [pageDataSource(ds.id) for ds in plan.dataSources]
+		handles = [handle for handle in handles if handle is not None]
+		entries = [handle.peek() for handle in handles]
+		entries = [entry for entry in entries if entry is not None]
+		if len(entries)==0:
+			return False
+
+		oldest = max(entries, key=lambda entry : entry.age())
+		msg = f'Data as of {time.strftime("%H:%M:%S", time.localtime(oldest.loadedAt))} ({oldest.age():.0f}s old)'
+		if any(handle.failing() is not None for handle in handles):
+			msg += ' - some sources unavailable'
+		elif oldest.expired():
+			msg += ' - refreshing'
+		st.caption(msg)
+		return True
+
+	except Exception as err:
+		logging.error(err)
+		return False
+
+
+@performance
+@trace
+def uxContainer( containers : tuple ) -> dict :
 	
 	ux_containers = {}
 	
 	try:
-		if (CONST_CFG_APP_CONTAINERS not in configuration):
-			return ux_containers
-
-		for container in configuration[CONST_CFG_APP_CONTAINERS]:	
-			contId = ('undefined' if 'id' not in container else container['id'])
-			logging.info(f'container "{contId}"" render - started')
-			stContainer = st.container(border=container[CONST_CFG_APP_CONTAINERS_BORDER],height=container[CONST_CFG_APP_CONTAINERS_HEIGHT] )
+		for container in containers:	
+			logging.info(f'container "{container.id}"" render - started')
+			stContainer = st.container(border=container.border,height=container.height )
 			with stContainer:	# ver 1.7 - ref:0001
-				if (CONST_CFG_APP_CONTAINERS_TXT in container and len(container[CONST_CFG_APP_CONTAINERS_TXT])>0):
-					st.write(container[CONST_CFG_APP_CONTAINERS_TXT])	
+				if (len(container.txt)>0):
+					st.write(container.txt)	
 				else:
-					logging.warning(f'container {contId}): no txt rendered')
-				if ( CONST_CFG_APP_IMG in container): # ver 1.7 - ref:0002 
-					st.image(container[CONST_CFG_APP_IMG])
-				ux_containers[container[CONST_CFG_APP_CONTAINERS_ID]]=container
+					logging.warning(f'container {container.id}): no txt rendered')
+				if ( container.img != CONST_CFG_BLANK): # ver 1.7 - ref:0002 
+					st.image(container.img)
+				ux_containers[container.id]=container
 				uxCanvas(container)
 
 	except Exception as err:
@@ -360,67 +469,48 @@ def uxContainer( fullConfiguration : dict, configuration : dict) -> dict :
 	finally:
 		return ux_containers
 
+def uxHeading( node, stHndl ) -> None :
+	"""The title/subheader/img/txt block shared by columns and rows."""
+	if ( node.title != CONST_CFG_BLANK ) :		
+		st.header(node.title)
+
+	if ( node.subheader != CONST_CFG_BLANK ) :
+		st.subheader(node.subheader)
+	
+	if ( node.img != CONST_CFG_BLANK ) :
+		st.image(node.img)
+
+	if ( node.txt != CONST_CFG_BLANK ) : 
+		stHndl.write(node.txt)
+
 @performance
 @trace
-def uxRenderMatrix( configuration : dict) -> dict:
+def uxRenderMatrix( plan ) -> dict:
 	ux_matrix={}
 	
 	try:
-		if CONST_CFG_APP_COLS not in siteOptions(configuration,CONST_CFG_APP_COLS) :
+		if len(plan.columns)==0 :
 			logging.warning(f'No Columns defined under Site. skipping column render!')
+			return ux_matrix
 
 		# ver 1.7 - ref:0003
-		ux_cols=st.columns(len(siteOptions(configuration,CONST_CFG_APP_COLS)),gap=siteOptions(configuration,CONST_CFG_APP_GAP,CONST_CFG_APP_GAP_DEF))
+		ux_cols=st.columns(len(plan.columns),gap=plan.gap)
 		
-		#DRY!!
-		#TODO make this tidy 
-		for i,c in enumerate(ux_cols):
+		for col,c in zip(plan.columns,ux_cols):
 
 			with c:
-				headerTxt = columnOptions(configuration,CONST_CFG_APP_TITLE,i,CONST_CFG_BLANK)
-				subheaderTxt = columnOptions(configuration,CONST_CFG_APP_SUBTITLE,i,CONST_CFG_BLANK)
-				txt = columnOptions(configuration,CONST_CFG_APP_CONTAINERS_TXT,i,CONST_CFG_BLANK)
-
-				id = columnOptions(configuration,'id',i,'undefined')
-				if ( headerTxt != CONST_CFG_BLANK ) :		
-					st.header(headerTxt)
-
-				if ( subheaderTxt != CONST_CFG_BLANK ) :
-					st.subheader(subheaderTxt)
-				
-				if (columnOptions(configuration,CONST_CFG_APP_IMG,i,CONST_CFG_BLANK)) != CONST_CFG_BLANK:
-					st.image(columnOptions(configuration,CONST_CFG_APP_IMG,i,CONST_CFG_BLANK))
-
-				if (txt != CONST_CFG_BLANK) : 
-					c.write(txt)
-
-				uxContainer(configuration,configuration[CONST_CFG_APP_LANG][CONST_CFG_APP_SITE][CONST_CFG_APP_COLS][i])
-				
-				if CONST_CFG_APP_ROWS not in siteOptions(configuration,CONST_CFG_APP_COLS)[i] :
-					logging.warning(f'No Rows defined under Column:{id}')
+				uxHeading(col,c)
+				uxContainer(col.containers)
 				
-				else:
-					ux_rows=st.columns(len(siteOptions(configuration,CONST_CFG_APP_COLS)[i][CONST_CFG_APP_ROWS]))
-				
-					for j,r in enumerate(ux_rows):
-						with r:
-							rowHeaderTxt = rowOptions(configuration,CONST_CFG_APP_TITLE,i,j,CONST_CFG_BLANK)
-							rowSubHeaderTxt = rowOptions(configuration,CONST_CFG_APP_SUBTITLE,i,j,CONST_CFG_BLANK)
-							rowTxt = rowOptions(configuration,CONST_CFG_APP_CONTAINERS_TXT,i,j,CONST_CFG_BLANK)
-
-							if ( rowHeaderTxt != CONST_CFG_BLANK) :	
-								st.header(rowHeaderTxt)
-
-							if ( rowSubHeaderTxt != CONST_CFG_BLANK) :	
-								st.subheader(rowSubHeaderTxt)
-
-							if (rowOptions(configuration,CONST_CFG_APP_IMG,i,j,CONST_CFG_BLANK)) != CONST_CFG_BLANK:
-								st.image(rowOptions(configuration,CONST_CFG_APP_IMG,i,j,CONST_CFG_BLANK))
-							
-							if ( rowTxt != CONST_CFG_BLANK ) :
-								r.write(rowTxt)
-
-							uxContainer(configuration,configuration[CONST_CFG_APP_LANG][CONST_CFG_APP_SITE][CONST_CFG_APP_COLS][i][CONST_CFG_APP_ROWS][j]) 
+				if col.rows is None :
+					logging.warning(f'No Rows defined under Column:{col.id}')
+					continue
+
+				ux_rows=st.columns(len(col.rows))
+				for row,r in zip(col.rows,ux_rows):
+					with r:
+						uxHeading(row,r)
+						uxContainer(row.containers) 
 						
 	except Exception as err:
 		logging.error(err)
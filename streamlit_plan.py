@@ -0,0 +1,290 @@
+import os
+import json
+import logging
+import threading
+import streamlit_helper as stHelper
+import streamlit_handlers as stHandlers
+import streamlit_transforms as stTransforms
+
+from types import MappingProxyType
+from typing import Final
+from vwlogger import trace
+from vwlogger import performance
+
+CONST_VER						: Final[str]	= '1.0'
+
+CONST_CFG_APP_PAGETITLE			: Final[str]	= 'pageTitle'
+CONST_CFG_NODE_ID				: Final[str]	= 'id'
+CONST_CFG_NODE_UNDEFINED		: Final[str]	= 'undefined'
+CONST_CFG_DS_COLUMNS			: Final[str]	= 'columns'
+CONST_CFG_WINDOW				: Final[str]	= 'window'
+CONST_READ_ONLY_MODE 			: Final[str]	= 'r'
+
+
+
+class PlanNode:
+	"""Base of the compiled render plan, a node is frozen once __init__ has run."""
+	__slots__ = ()
+
+	def __setattr__(self, nom, val):
+		raise AttributeError(f'{self.__class__.__name__} is immutable, recompile the page to change {nom}')
+
+	def _set(self, **kwargs):
+		for nom, val in kwargs.items():
+			object.__setattr__(self, nom, val)
+
+
+class DataSourcePlan(PlanNode):
+	"""A Resources.DataSources entry, columns is what the page's canvases read from it
+	(None for every column) plus any the entry lists under 'columns'.
+
+	window is the entry's own 'window' or else the widest window its canvases
+	share, as (on, seconds). None reads the whole history."""
+	__slots__ = ('id', 'configuration', 'columns', 'window')
+
+	def __init__(self, configuration : dict, columns : frozenset = None, window : tuple = None):
+		if columns is not None and CONST_CFG_DS_COLUMNS in configuration:
+			columns = columns | frozenset(configuration[CONST_CFG_DS_COLUMNS])
+		ownWindow = _window(configuration)
+		self._set(id=configuration[CONST_CFG_NODE_ID], configuration=MappingProxyType(dict(configuration)), columns=columns,
+				  window=window if ownWindow is None else ownWindow)
+
+
+class CanvasPlan(PlanNode):
+	"""A Resources.Canvas entry, configuration is what the painter is handed.
+
+	refresh is the canvas's own re-render interval in milliseconds, 0 when it only
+	updates with the page.
+	"""
+	__slots__ = ('id', 'handler', 'refresh', 'dataSource', 'configuration')
+
+	def __init__(self, configuration : dict, dataSource : DataSourcePlan):
+		self._set(id=configuration[CONST_CFG_NODE_ID],
+				  handler=configuration.get('handler',CONST_CFG_NODE_UNDEFINED),
+				  refresh=int(configuration.get(stHelper.CONST_CFG_APP_CANVAS_REFRESH,0)),
+				  dataSource=dataSource,
+				  configuration=MappingProxyType(dict(configuration)))
+
+
+class ContainerPlan(PlanNode):
+	__slots__ = ('id', 'height', 'border', 'txt', 'img', 'canvas')
+
+	def __init__(self, configuration : dict, canvas : CanvasPlan):
+		self._set(id=configuration.get(CONST_CFG_NODE_ID,CONST_CFG_NODE_UNDEFINED),
+				  height=configuration.get(stHelper.CONST_CFG_APP_CONTAINERS_HEIGHT),
+				  border=configuration.get(stHelper.CONST_CFG_APP_CONTAINERS_BORDER),
+				  txt=configuration.get(stHelper.CONST_CFG_APP_CONTAINERS_TXT,stHelper.CONST_CFG_BLANK),
+				  img=configuration.get(stHelper.CONST_CFG_APP_IMG,stHelper.CONST_CFG_BLANK),
+				  canvas=canvas)
+
+
+class RowPlan(PlanNode):
+	__slots__ = ('id', 'title', 'subheader', 'img', 'txt', 'containers')
+
+	def __init__(self, configuration : dict, containers : tuple):
+		self._set(id=configuration.get(CONST_CFG_NODE_ID,CONST_CFG_NODE_UNDEFINED),
+				  title=configuration.get(stHelper.CONST_CFG_APP_TITLE,stHelper.CONST_CFG_BLANK),
+				  subheader=configuration.get(stHelper.CONST_CFG_APP_SUBTITLE,stHelper.CONST_CFG_BLANK),
+				  img=configuration.get(stHelper.CONST_CFG_APP_IMG,stHelper.CONST_CFG_BLANK),
+				  txt=configuration.get(stHelper.CONST_CFG_APP_CONTAINERS_TXT,stHelper.CONST_CFG_BLANK),
+				  containers=containers)
+
+
+class ColumnPlan(RowPlan):
+	"""A Site.Columns entry, rows is None when the column defines no Rows."""
+	__slots__ = ('rows',)
+
+	def __init__(self, configuration : dict, containers : tuple, rows : tuple):
+		super().__init__(configuration, containers)
+		self._set(rows=rows)
+
+
+class SidebarPlan(PlanNode):
+	__slots__ = ('title', 'contents')
+
+	def __init__(self, configuration : dict):
+		self._set(title=configuration.get(stHelper.CONST_CFG_APP_TITLE,stHelper.CONST_CFG_NOTDEFINED),
+				  contents=tuple(c.get(stHelper.CONST_CFG_APP_CONTAINERS_TXT,stHelper.CONST_CFG_BLANK) for c in configuration.get(stHelper.CONST_CFG_APP_SIDEBAR_CONTENTS,[])))
+
+
+class PagePlan(PlanNode):
+	"""A page config compiled once into what the render needs, with defaults resolved.
+
+	dataSources holds only the sources a rendered container can reach, the order
+	follows Resources.DataSources.
+	"""
+	__slots__ = ('title', 'subheader', 'pageTitle', 'layout', 'pageIcon', 'sidebarState', 'hamburger',
+				 'bgImg', 'css', 'helpUrl', 'about', 'gap', 'sidebar', 'containers', 'columns',
+				 'canvases', 'dataSources')
+
+	def __init__(self, configuration : dict, lang : str = stHelper.CONST_CFG_APP_LANG):
+		page		= configuration[lang]
+		site		= page.get(stHelper.CONST_CFG_APP_SITE,{})
+		resources	= page.get(stHelper.CONST_CFG_APP_RESOURCES,{})
+
+		projections = _projections(site, resources)
+		windows		= _windows(site, resources)
+		dataSources = {ds[CONST_CFG_NODE_ID] : DataSourcePlan(ds, projections.get(ds[CONST_CFG_NODE_ID]), windows.get(ds[CONST_CFG_NODE_ID])) for ds in resources.get(stHelper.CONST_CFG_APP_DATASOURCES,[])}
+		canvases	= {}
+		for cr in resources.get(stHelper.CONST_CFG_APP_CANVAS,[]):
+			dsId = cr.get(stHelper.CONST_CFG_APP_DATASOURCE_REF,stHelper.CONST_CFG_BLANK)
+			if len(dsId)>0 and dsId not in dataSources:
+				logging.warning(f"canvas {cr[CONST_CFG_NODE_ID]} uses data source {dsId} which is not defined under DataSources")
+			canvases[cr[CONST_CFG_NODE_ID]] = CanvasPlan(cr, dataSources.get(dsId))
+
+		def _containers(node : dict) -> tuple :
+			compiled = []
+			for c in node.get(stHelper.CONST_CFG_APP_CONTAINERS,[]):
+				canvasId = c.get(stHelper.CONST_CFG_APP_CANVAS_REF)
+				if canvasId is not None and canvasId not in canvases:
+					logging.warning(f"container {c.get(CONST_CFG_NODE_ID)} uses canvas {canvasId} which is not defined under Canvas")
+				compiled.append(ContainerPlan(c, canvases.get(canvasId)))
+			return tuple(compiled)
+
+		columns = tuple(ColumnPlan(col,
+								   _containers(col),
+								   None if stHelper.CONST_CFG_APP_ROWS not in col else tuple(RowPlan(row, _containers(row)) for row in col[stHelper.CONST_CFG_APP_ROWS]))
+						for col in site.get(stHelper.CONST_CFG_APP_COLS,[]))
+		containers = _containers(site)
+
+		self._set(title=page.get(stHelper.CONST_CFG_APP_TITLE,stHelper.CONST_CFG_BLANK),
+				  subheader=page.get(stHelper.CONST_CFG_APP_SUBTITLE,stHelper.CONST_CFG_BLANK),
+				  pageTitle=page.get(CONST_CFG_APP_PAGETITLE,stHelper.CONST_CFG_BLANK),
+				  layout=page.get(stHelper.CONST_CFG_APP_LAYOUT,stHelper.CONST_CFG_BLANK),
+				  pageIcon=page.get(stHelper.CONST_CFG_APP_PAGEICON,stHelper.CONST_CFG_BLANK),
+				  sidebarState=page.get(stHelper.CONST_CFG_APP_INITIALSIDEBAR,stHelper.CONST_CFG_APP_SIDEBAR_DEF),
+				  hamburger=page.get(stHelper.CONST_CFG_APP_HAMBURGER,False),
+				  bgImg=page.get(stHelper.CONST_CFG_APP_BGIMG,stHelper.CONST_CFG_BLANK),
+				  css=page.get(stHelper.CONST_CFG_APP_CSS,stHelper.CONST_CFG_BLANK),
+				  helpUrl=page.get(stHelper.CONST_CFG_APP_MI_SUPPORT,stHelper.CONST_CFG_NOTDEFINED),
+				  about=page.get(stHelper.CONST_CFG_APP_MI_ABOUT,stHelper.CONST_CFG_NOTDEFINED),
+				  gap=site.get(stHelper.CONST_CFG_APP_GAP,stHelper.CONST_CFG_APP_GAP_DEF),
+				  sidebar=None if stHelper.CONST_CFG_APP_SIDEBAR not in site else SidebarPlan(site[stHelper.CONST_CFG_APP_SIDEBAR]),
+				  containers=containers,
+				  columns=columns,
+				  canvases=MappingProxyType(canvases),
+				  dataSources=tuple(ds for nom, ds in dataSources.items() if nom in projections))
+
+	def renderOrder(self) :
+		"""Every container of the page in the order the render emits them."""
+		return walkContainers(self.containers, self.columns)
+
+
+def _reachedCanvases( site : dict, resources : dict ) :
+	"""(data source id, canvas config) for every container of the site that draws a canvas from a data source."""
+	canvases = {cr[CONST_CFG_NODE_ID] : cr for cr in resources.get(stHelper.CONST_CFG_APP_CANVAS,[])}
+	nodes = [site]
+	for col in site.get(stHelper.CONST_CFG_APP_COLS,[]):
+		nodes.append(col)
+		nodes.extend(col.get(stHelper.CONST_CFG_APP_ROWS,[]))
+
+	for node in nodes:
+		for c in node.get(stHelper.CONST_CFG_APP_CONTAINERS,[]):
+			cr = canvases.get(c.get(stHelper.CONST_CFG_APP_CANVAS_REF))
+			dsId = stHelper.CONST_CFG_BLANK if cr is None else cr.get(stHelper.CONST_CFG_APP_DATASOURCE_REF,stHelper.CONST_CFG_BLANK)
+			if len(dsId)>0:
+				yield dsId, cr
+
+def _projections( site : dict, resources : dict ) -> dict :
+	"""data source id -> the columns the rendered canvases read from it, None where one
+	of them needs the whole frame. Only sources a container reaches get an entry."""
+	projections = {}
+	for dsId, cr in _reachedCanvases(site, resources):
+		needed = stHandlers.canvasColumns(cr)
+		if dsId not in projections:
+			projections[dsId] = needed
+		elif projections[dsId] is not None:
+			projections[dsId] = None if needed is None else projections[dsId] | needed
+	return projections
+
+def _window( configuration : dict ) -> tuple :
+	try:
+		return stTransforms.windowSpec(configuration.get(CONST_CFG_WINDOW))
+	except ValueError as err:
+		logging.warning(f"{configuration.get(CONST_CFG_NODE_ID)} window ignored - {err}")
+		return None
+
+def _windows( site : dict, resources : dict ) -> dict :
+	"""data source id -> the widest window of the rendered canvases reading it, None unless
+	every one of them has a window on the same column."""
+	windows = {}
+	for dsId, cr in _reachedCanvases(site, resources):
+		window = stHandlers.canvasWindow(cr)
+		if dsId not in windows:
+			windows[dsId] = window
+		elif windows[dsId] is not None:
+			windows[dsId] = None if window is None or window[0] != windows[dsId][0] else max(windows[dsId], window)
+	return windows
+
+
+def walkContainers( containers : tuple, columns : tuple ) :
+	"""Every container of a page in render order, site level first."""
+	yield from containers
+	for col in columns:
+		yield from col.containers
+		for row in (col.rows or ()):
+			yield from row.containers
+
+
+class PlanCache:
+	"""Compiled pages and loaded JSON keyed by path, recompiled when the file's mtime or size changes."""
+
+	def __init__(self):
+		self.hits		= 0
+		self.compiles	= 0
+		self._entries	= {}
+		self._lock		= threading.Lock()
+
+	def _get(self, kind : str, path : str, build):
+		fStat = os.stat(path)
+		key = (kind, os.path.abspath(path))
+		stamp = (fStat.st_mtime_ns, fStat.st_size)
+		with self._lock:
+			cached = self._entries.get(key)
+			if cached is not None and cached[0] == stamp:
+				self.hits += 1
+				return cached[1]
+
+		val = build(path)
+		with self._lock:
+			self._entries[key] = (stamp, val)
+			self.compiles += 1
+		logging.info(f'{kind} {path} (re)loaded')
+		return val
+
+	def json(self, path : str) -> dict:
+		return self._get('json', path, _readJson)
+
+	def page(self, path : str) -> PagePlan:
+		return self._get('plan', path, lambda p : PagePlan(self.json(p)))
+
+
+def _readJson( path : str ) -> dict:
+	with open( path, CONST_READ_ONLY_MODE) as fHndl :
+		return json.load( fHndl )
+
+
+g_planCache = PlanCache()
+
+@performance
+@trace
+def loadPagePlan( path : str ) -> PagePlan:
+	return g_planCache.page(path)
+
+def version() :
+	print(f"{version.__module__}.{version.__name__} {CONST_VER}")
+
+def main() -> int:
+	import sys
+	logging.basicConfig(level=logging.INFO)
+	plan = loadPagePlan(sys.argv[1] if len(sys.argv)>1 else './dev.cfg.json')
+	for container in plan.renderOrder():
+		logging.info(f"container {container.id} canvas:{None if container.canvas is None else container.canvas.id}")
+	logging.info(f"data sources {[(ds.id, None if ds.columns is None else sorted(ds.columns), ds.window) for ds in plan.dataSources]}")
+	return 0
+# ----------------------------------------------------------------
+# ----------------------------------------------------------------
+# ----------------------------------------------------------------
+version()
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,370 @@
+import time
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Final
+from vwlogger import trace
+from vwlogger import performance
+
+CONST_VER					: Final[str]	= '1.0'
+
+CONST_DS_MINMAX				: Final[str]	= 'minmax'
+CONST_DS_LTTB				: Final[str]	= 'lttb'
+CONST_DS_DEF_METHOD			: Final[str]	= CONST_DS_MINMAX
+CONST_MEMO_SIZE				: Final[int]	= 64
+CONST_STEP_DATETIME			: Final[str]	= 'datetime'
+CONST_STEP_ORDER			: Final[str]	= 'order'
+CONST_STEP_DOWNSAMPLE		: Final[str]	= 'downsample'
+CONST_STEP_AGGREGATE		: Final[str]	= 'aggregate'
+CONST_AGG_DEF_FUNC			: Final[str]	= 'mean'
+CONST_AGG_KEEP_FUNC			: Final[str]	= 'last'
+CONST_STEP_WINDOW			: Final[str]	= 'window'
+CONST_WINDOW_LAST			: Final[str]	= 'last'
+CONST_WINDOW_ON				: Final[str]	= 'on'
+
+
+
+def _asNumeric( s ) -> np.ndarray :
+	"""A series as float64 for the area/extreme maths, datetimes become epoch ns, None for anything else."""
+	if s is None:
+		return None
+	if pd.api.types.is_datetime64_any_dtype(s):
+		return s.to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(np.float64)
+	if pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s):
+		return s.to_numpy(dtype=np.float64, na_value=np.nan)
+	return None
+
+
+def _bucketEdges( n : int, buckets : int ) -> np.ndarray :
+	return np.linspace(0, n, buckets+1).astype(np.int64)
+
+
+def minMaxIndex( y : np.ndarray, points : int ) -> np.ndarray :
+	"""Positions of the min and max of y in each of points//2 equal buckets.
+
+	Fully vectorized, each bucket keeps both of its extremes so spikes survive.
+	"""
+	n = len(y)
+	buckets = max(1, points//2)
+	edges = _bucketEdges(n, buckets)
+	starts = edges[:-1][np.diff(edges)>0]
+	counts = np.diff(np.append(starts, n))
+	bucketOf = np.repeat(np.arange(len(starts)), counts)
+
+	picked = []
+	for reduce in (np.fmin, np.fmax):
+		extreme = reduce.reduceat(y, starts)
+		hits = np.flatnonzero(y == extreme[bucketOf])
+		_, first = np.unique(bucketOf[hits], return_index=True)
+		picked.append(hits[first])
+
+	return np.concatenate(picked)
+
+
+def lttbIndex( x : np.ndarray, y : np.ndarray, points : int ) -> np.ndarray :
+	"""Largest-Triangle-Three-Buckets, the positions of the points picked from (x, y).
+
+	Walks the buckets in order (each pick depends on the last one) but the area
+	test inside a bucket is one numpy expression.
+	"""
+	n = len(y)
+	if points >= n or points < 3:
+		return np.arange(n)
+
+	y = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(np.nanmean(y)) else 0.0, y)
+	edges = 1 + _bucketEdges(n-2, points-2)
+	picked = np.empty(points, dtype=np.int64)
+	picked[0], picked[-1] = 0, n-1
+
+	last = 0
+	for b in range(points-2):
+		start, end = edges[b], edges[b+1]
+		nextStart, nextEnd = edges[b+1], (edges[b+2] if b+2 < len(edges) else n)
+		if end <= start:
+			picked[b+1] = last
+			continue
+		avgX = x[nextStart:nextEnd].mean() if nextEnd > nextStart else x[n-1]
+		avgY = y[nextStart:nextEnd].mean() if nextEnd > nextStart else y[n-1]
+		area = np.abs((x[last]-avgX)*(y[start:end]-y[last]) - (x[last]-x[start:end])*(avgY-y[last]))
+		last = start + int(np.argmax(area))
+		picked[b+1] = last
+
+	return picked
+
+
+@performance
+@trace
+def downsampleIndex( x, ys : list, points : int, method : str = CONST_DS_DEF_METHOD ) -> np.ndarray :
+	"""Sorted row positions that keep roughly points rows for the series in ys.
+
+	x is the horizontal series (or None to use row order), ys the plotted series.
+	The points are shared out between the series and the positions picked for
+	each are merged, the first and last rows always stay. None when no series in
+	ys is numeric, there is then nothing to downsample by.
+	"""
+	n = len(ys[0]) if len(ys)>0 else (0 if x is None else len(x))
+	xs = _asNumeric(x)
+	if xs is None or np.isnan(xs).any():
+		xs = np.arange(n, dtype=np.float64)
+
+	picked = [np.array([0, n-1])]
+	points = max(3, points//max(1,len(ys)))
+	for s in ys:
+		y = _asNumeric(s)
+		if y is None:
+			logging.warning(f'downsample skipped non numeric series {getattr(s, "name", "?")}')
+			continue
+		if method == CONST_DS_LTTB:
+			picked.append(lttbIndex(xs, y, points))
+		else:
+			picked.append(minMaxIndex(y, points))
+
+	if len(picked)==1:
+		return None
+	return np.unique(np.concatenate(picked))
+
+
+def topRows( df, col : str, ascending : bool, n : int ) :
+	"""The first n rows of df ordered by col, the same rows in the same order as a stable
+	sort_values(...).head(n) but selected in O(len) with nsmallest/nlargest.
+
+	Falls back to the full sort where nsmallest/nlargest would differ, a column with
+	NaNs (they are dropped rather than sorted last) or one that is not numeric/datetime.
+	"""
+	s = df[col]
+	if (pd.api.types.is_numeric_dtype(s) or pd.api.types.is_datetime64_any_dtype(s)) and not pd.api.types.is_bool_dtype(s) and not s.hasnans:
+		return df.nsmallest(n, col) if ascending else df.nlargest(n, col)
+
+	return df.sort_values(by=[col], ascending=ascending, kind='stable').head(n)
+
+
+def toDatetime( df, col : str, fmt : str ) :
+	"""df with col as datetimes, untouched when it already is. The parse is done on a copy, never in place."""
+	if pd.api.types.is_datetime64_any_dtype(df[col]):
+		return df
+
+	logging.warning(f"parsing {col} once per data version, declare it under the data source 'datetimes' to parse it once per fetch")
+	return df.assign(**{col : pd.to_datetime(df[col], format=fmt)})
+
+
+def orderRows( df, col : str, ascending : bool, n : int ) :
+	"""df sorted by col (None keeps the row order) then cut to its first n rows (0 keeps them all)."""
+	if col is not None and n > 0 and col in df:
+		return topRows(df, col, ascending, n)
+	if col is not None:
+		df = df.sort_values(by=[col], ascending=ascending, kind='stable')
+	return df if n <= 0 else df.head(n)
+
+
+def downsampleRows( df, x : str, ys : tuple, points : int, method : str ) :
+	"""df reduced to about points rows per series in ys, see downsampleIndex."""
+	if points <= 0 or len(df) <= points:
+		return df
+
+	idx = downsampleIndex(df[x] if x in df else None, [df[c] for c in ys if c in df], points, method)
+	if idx is None:
+		return df
+	logging.info(f"downsampled resultset of {len(df)} rows to {len(idx)} using {method}")
+	return df.iloc[idx]
+
+
+def windowSpec( window : dict ) -> tuple :
+	"""A {"last" : "24h", "on" : "Timestamp_UTC"} option as (on, seconds), None when window is empty.
+
+	last is anything pd.Timedelta parses ('15min', '7d', '36h'...).
+	"""
+	if not window:
+		return None
+	if CONST_WINDOW_ON not in window or CONST_WINDOW_LAST not in window:
+		raise ValueError(f'window {window} needs both "{CONST_WINDOW_LAST}" and "{CONST_WINDOW_ON}"')
+	return (window[CONST_WINDOW_ON], pd.Timedelta(window[CONST_WINDOW_LAST]).total_seconds())
+
+
+def windowStart( seconds : float, tz = None ) -> pd.Timestamp :
+	"""The start of a window of the last seconds up to now. Naive timestamps are taken as UTC,
+	tz (the column's zone) gives an aware start to compare with an aware column."""
+	now = pd.Timestamp.now(tz='UTC')
+	now = now.tz_localize(None) if tz is None else now.tz_convert(tz)
+	return now-pd.Timedelta(seconds=seconds)
+
+
+def windowRows( df, on : str, seconds : float, fmt : str = None ) :
+	"""The rows of df whose on timestamp falls in the last seconds, on is parsed with fmt when it is not datetimes yet."""
+	if on not in df:
+		logging.warning(f"window column {on} is not in the frame, the window is ignored")
+		return df
+
+	col = df[on]
+	if not pd.api.types.is_datetime64_any_dtype(col):
+		col = pd.to_datetime(col, format=fmt if fmt else None)
+	keep = (col >= windowStart(seconds, getattr(col.dt, 'tz', None))).to_numpy()
+	logging.info(f"window of the last {seconds:.0f}s on {on} keeps {int(keep.sum())} of {len(df)} rows")
+	return df if keep.all() else df[keep]
+
+
+def aggregateName( col : str, func : str ) -> str :
+	"""The column an aggregate lands in when col is reduced by more than one function."""
+	return f'{col} ({func})'
+
+
+@performance
+@trace
+def aggregateRows( df, on : str, freq : str, by : tuple, agg : tuple, keep : tuple = () ) :
+	"""df reduced to one row per group of the by columns and, when freq is set, per freq
+	wide bin of the datetime column on (empty bins stay, as NaN rows, so lines show the gap).
+
+	agg is ((column, (function names...)), ...). A column with one function keeps its
+	name, one with several gets a column per function named by aggregateName. An empty
+	agg reduces every other numeric column with the mean. The columns in keep (what the
+	painter draws) that agg leaves out take their last value in the group rather than
+	being dropped. The names go to pandas' groupby, so the built in ones ('mean', 'max',
+	'last'...) run vectorized.
+	"""
+	keys = list(by)
+	if freq is not None:
+		if on is None or on not in df:
+			raise ValueError(f'resample to {freq} needs a datetime column, {on} is not in the frame')
+		if not pd.api.types.is_datetime64_any_dtype(df[on]):
+			raise ValueError(f'resample to {freq} needs {on} as datetimes, it is {df[on].dtype}')
+		keys.append(pd.Grouper(key=on, freq=freq))
+
+	spec = {col : funcs[0] if len(funcs)==1 else list(funcs) for col, funcs in agg}
+	if len(spec)==0:
+		spec = {col : CONST_AGG_DEF_FUNC for col in df.columns
+				if col not in by and col != on and pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])}
+	spec.update({col : CONST_AGG_KEEP_FUNC for col in keep if col in df and col not in spec and col not in by and col != on})
+
+	out = df.groupby(keys, sort=True, observed=True).agg(spec)
+	if isinstance(out.columns, pd.MultiIndex):
+		out.columns = [col if isinstance(spec[col], str) else aggregateName(col, func) for col, func in out.columns]
+	out = out.reset_index()
+	logging.info(f"aggregated resultset of {len(df)} rows to {len(out)} by {list(by)} every {freq}")
+	return out
+
+
+# step name -> function(df, *args) returning the derived frame
+g_steps = {
+	CONST_STEP_DATETIME		: toDatetime,
+	CONST_STEP_WINDOW		: windowRows,
+	CONST_STEP_AGGREGATE	: aggregateRows,
+	CONST_STEP_ORDER		: orderRows,
+	CONST_STEP_DOWNSAMPLE	: downsampleRows,
+}
+
+
+class TransformMemo:
+	"""LRU memo of derived frames, keyed by the data version plus whatever describes the transform.
+
+	The frames are shared between canvases, treat them as read only. A key that
+	is being built is built once, concurrent callers wait for that build. Every
+	hit adds what the build cost to savedSeconds, the recomputation avoided.
+	"""
+
+	def __init__(self, maxEntries : int = CONST_MEMO_SIZE):
+		self.maxEntries		= maxEntries
+		self.hits			= 0
+		self.misses			= 0
+		self.coalesced		= 0
+		self.savedSeconds	= 0.0
+		self._entries		= OrderedDict()	# key -> (frame, seconds it took to build)
+		self._inflight		= {}
+		self._lock			= threading.Lock()
+
+	def get(self, key : tuple, build ):
+		with self._lock:
+			if key in self._entries:
+				self._entries.move_to_end(key)
+				val, cost = self._entries[key]
+				self.hits += 1
+				self.savedSeconds += cost
+				return val
+			future = self._inflight.get(key)
+			if future is None:
+				future = self._inflight[key] = Future()
+				self.misses += 1
+				owner = True
+			else:
+				self.coalesced += 1
+				owner = False
+
+		if not owner:
+			val, cost = future.result()
+			with self._lock:
+				self.savedSeconds += cost
+			return val
+
+		try:
+			s = time.perf_counter()
+			val = build()
+			cost = time.perf_counter()-s
+		except Exception as err:
+			with self._lock:
+				del self._inflight[key]
+			future.set_exception(err)
+			raise
+
+		with self._lock:
+			del self._inflight[key]
+			self._entries[key] = (val, cost)
+			while len(self._entries) > self.maxEntries:
+				self._entries.popitem(last=False)
+		future.set_result((val, cost))
+		return val
+
+	def stats(self) -> dict:
+		with self._lock:
+			return {'entries' : len(self._entries), 'hits' : self.hits, 'misses' : self.misses,
+					'coalesced' : self.coalesced, 'savedSeconds' : self.savedSeconds}
+
+
+g_transformMemo = TransformMemo()
+
+@performance
+@trace
+def applyTransforms( df, version, steps : tuple, memo : TransformMemo = None ) :
+	"""df put through steps, each a (name in g_steps, args...) tuple, in order.
+
+	Every prefix of steps is memoised under (version, prefix), so canvases that
+	share a data version and their leading steps (the same sort and head, say)
+	share those frames and only compute where they differ. Steps must be hashable
+	and normalised by the caller, a version of None turns the memo off.
+	"""
+	memo = g_transformMemo if memo is None else memo
+	for i, step in enumerate(steps):
+		fn = g_steps[step[0]]
+		if version is None:
+			df = fn(df, *step[1:])
+		else:
+			df = memo.get((version,)+steps[:i+1], lambda src=df, fn=fn, step=step : fn(src, *step[1:]))
+	return df
+
+def version() :
+	print(f"{version.__module__}.{version.__name__} {CONST_VER}")
+
+def main() -> int:
+	logging.basicConfig(level=logging.INFO)
+	n = 500000
+	df = pd.DataFrame({'t' : pd.date_range('2024-01-01', periods=n, freq='s'),
+					   'v' : np.sin(np.linspace(0, 60, n)) + np.random.randn(n)*0.05})
+	df.loc[123457, 'v'] = 25.0
+	for method in (CONST_DS_MINMAX, CONST_DS_LTTB):
+		s = time.perf_counter()
+		idx = downsampleIndex(df['t'], [df['v']], 2000, method)
+		logging.info(f'{method}: {n} -> {len(idx)} rows in {time.perf_counter()-s:.3f} seconds, spike kept:{123457 in idx}')
+	shared = ((CONST_STEP_ORDER, 't', False, 100000),)
+	for ys in (('v',), ('v',)):
+		applyTransforms(df, 1, shared+((CONST_STEP_DOWNSAMPLE, 't', ys, 2000, CONST_DS_DEF_METHOD),))
+	logging.info(g_transformMemo.stats())
+	hourly = applyTransforms(df, 1, ((CONST_STEP_AGGREGATE, 't', '1h', (), (('v', ('mean', 'max')),)),))
+	logging.info(f'{n} rows -> {len(hourly)} hourly rows, columns {list(hourly.columns)}')
+	return 0
+# ----------------------------------------------------------------
+# ----------------------------------------------------------------
+# ----------------------------------------------------------------
+version()
+if __name__ == '__main__':
+	main()
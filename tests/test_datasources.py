@@ -0,0 +1,226 @@
+import threading
+import time
+
+import fsspec
+import numpy as np
+import pandas as pd
+import pytest
+
+import streamlit_datasources as stData
+
+
+@pytest.fixture(autouse=True)
+def noSnapshots(monkeypatch):
+	# the shared cache would otherwise write snapshots under ./.cache
+	monkeypatch.setattr(stData.g_dataCache, 'snapshots', None)
+
+
+def _spec(nom, **kwargs):
+	return stData.DataSourceSpec(nom, 'memory', f'/tests/{nom}-{time.monotonic_ns()}.csv', stData.CONST_FMT_CSV, **kwargs)
+
+
+def _frame():
+	return pd.DataFrame({'a' : range(10)})
+
+
+def test_load_is_single_flight():
+	cache = stData.DataSourceCache()
+	spec = _spec('single')
+	started, release = threading.Event(), threading.Event()
+	calls = []
+
+	def loader():
+		calls.append(1)
+		started.set()
+		release.wait(5)
+		return _frame()
+
+	results = []
+	leader = threading.Thread(target=lambda : results.append(cache.load(spec, loader)))
+	leader.start()
+	started.wait(5)
+	follower = threading.Thread(target=lambda : results.append(cache.load(spec, loader)))
+	follower.start()
+	while cache.stats()['coalesced'] == 0:
+		time.sleep(0.01)
+	release.set()
+	leader.join(5)
+	follower.join(5)
+
+	assert len(calls) == 1
+	assert len(results) == 2 and results[0] is results[1]
+	assert cache.get(spec, loader) is results[0]
+
+
+def test_load_shares_a_failure_and_clears_it():
+	cache = stData.DataSourceCache()
+	spec = _spec('failure')
+	with pytest.raises(OSError):
+		cache.load(spec, lambda : (_ for _ in ()).throw(OSError('gone')))
+	assert cache.load(spec, _frame).df.equals(_frame())
+
+
+def test_breakers_open_trial_and_close():
+	breakers = stData.CircuitBreakers(failures=2, cooldown=0.1)
+	key = ('k',)
+	breakers.failure(key, OSError('1'))
+	assert breakers.allow(key) and not breakers.isOpen(key)
+
+	breakers.failure(key, OSError('2'))
+	assert breakers.isOpen(key) and not breakers.allow(key)
+	assert str(breakers.lastError(key)) == '2'
+
+	time.sleep(0.15)
+	assert breakers.allow(key)			# the half open trial
+	assert not breakers.allow(key)		# ... only one
+	breakers.failure(key, OSError('3'))
+	assert breakers.isOpen(key)
+
+	time.sleep(0.15)
+	assert breakers.allow(key)
+	breakers.success(key)
+	assert not breakers.isOpen(key) and breakers.lastError(key) is None
+	assert breakers.stats()['trips'] == 2
+
+
+def test_open_circuit_stops_fetches():
+	cache = stData.DataSourceCache(breakers=stData.CircuitBreakers(failures=2, cooldown=60))
+	spec = _spec('circuit')
+	calls = []
+
+	def loader():
+		calls.append(1)
+		raise OSError('down')
+
+	for _ in range(2):
+		with pytest.raises(OSError):
+			cache.load(spec, loader)
+	with pytest.raises(stData.DataSourceUnavailable):
+		cache.load(spec, loader)
+	assert len(calls) == 2
+
+
+def test_handle_times_out_without_a_copy():
+	spec = _spec('slow', timeout=0.1)
+	release = threading.Event()
+	handle = stData.DataSourceHandle(spec, lambda : release.wait(5) and _frame())
+	try:
+		with pytest.raises(TimeoutError):
+			handle.get()
+		assert isinstance(handle.failing(), TimeoutError)
+	finally:
+		release.set()
+
+
+def test_handle_returns_the_stale_copy_with_the_reason():
+	spec = _spec('stale', ttl=0)
+	stData.g_dataCache.put(spec.key(), _frame(), 0, loadedAt=time.time()-60)
+	stData.g_breakers.failure(spec.key(), OSError('down'))
+	try:
+		entry, error = stData.DataSourceHandle(spec, lambda : (_ for _ in ()).throw(OSError('down'))).get()
+		assert entry.df.equals(_frame())
+		assert isinstance(error, OSError)
+	finally:
+		stData.g_breakers.success(spec.key())
+
+
+def test_handle_returns_no_error_for_a_fresh_copy():
+	entry, error = stData.DataSourceHandle(_spec('fresh'), _frame).get()
+	assert error is None and entry.df.equals(_frame())
+
+
+def _hours(tz=None):
+	end = pd.Timestamp.now(tz='UTC').floor('h')
+	end = end.tz_localize(None) if tz is None else end.tz_convert(tz)
+	return pd.DataFrame({'t' : pd.date_range(end=end, periods=24*10, freq='h'), 'v' : np.arange(24*10)})
+
+
+@pytest.mark.parametrize('tz', [None, 'UTC'])
+def test_parquet_window_is_pushed_down(tmp_path, monkeypatch, tz):
+	path = str(tmp_path/'w.parquet')
+	_hours(tz).to_parquet(path, row_group_size=24)
+	seen = []
+	readParquet = pd.read_parquet
+	monkeypatch.setattr(stData.pd, 'read_parquet', lambda *args, **kwargs : seen.append(kwargs.get('filters')) or readParquet(*args, **kwargs))
+
+	spec = stData.DataSourceSpec('w', 'file', path, stData.CONST_FMT_PARQUET, columns=('v',), window=('t', 2*86400))
+	df = stData.readDataSource(fsspec.filesystem('file'), spec)
+
+	assert seen[-1] is not None and seen[-1][0][:2] == ('t', '>=')
+	assert 47 <= len(df) <= 49
+	assert list(df.columns) == ['t', 'v']
+
+
+def test_csv_window_is_filtered_per_chunk(tmp_path, monkeypatch):
+	monkeypatch.setattr(stData, 'CONST_WINDOW_CHUNK_ROWS', 50)
+	path = str(tmp_path/'w.csv')
+	_hours().assign(t=lambda df : df['t'].dt.strftime('%Y-%m-%d %H:%M:%S')).to_csv(path, index=False)
+
+	spec = stData.DataSourceSpec('w', 'file', path, stData.CONST_FMT_CSV, datetimes={'t' : '%Y-%m-%d %H:%M:%S'}, window=('t', 86400))
+	df = stData.readDataSource(fsspec.filesystem('file'), spec)
+
+	assert pd.api.types.is_datetime64_any_dtype(df['t'])
+	assert 23 <= len(df) <= 25
+	assert df['v'].is_monotonic_increasing and df['v'].iloc[-1] == 24*10-1
+
+
+def test_window_is_part_of_the_key():
+	plain = stData.DataSourceSpec('w', 'file', '/x.csv', stData.CONST_FMT_CSV, columns=('v',))
+	windowed = stData.DataSourceSpec('w', 'file', '/x.csv', stData.CONST_FMT_CSV, columns=('v',), window=('t', 60))
+	assert plain.key() != windowed.key()
+	assert windowed.columns == ('t', 'v')
+
+
+def test_hung_source_does_not_starve_the_others():
+	spec = _spec('hung', timeout=0.1)
+	release = threading.Event()
+	handle = stData.DataSourceHandle(spec, lambda : release.wait(10) and _frame())
+	rejected = stData.g_breakers.stats()['rejected']
+	try:
+		future = handle.prefetch()
+		for _ in range(6):
+			with pytest.raises((TimeoutError, stData.DataSourceUnavailable)):
+				handle.get()
+		assert handle.prefetch() is future		# the hung fetch is waited on, never queued again
+		assert stData.g_breakers.isOpen(spec.key())
+		assert stData.g_breakers.stats()['rejected'] > rejected
+
+		entry, error = stData.DataSourceHandle(_spec('healthy', timeout=1), _frame).get()
+		assert error is None and entry.df.equals(_frame())
+	finally:
+		release.set()
+		stData.g_breakers.success(spec.key())
+
+
+def test_follower_does_not_wait_on_a_failing_fetch():
+	breakers = stData.CircuitBreakers(failures=1, cooldown=60)
+	cache = stData.DataSourceCache(breakers=breakers)
+	spec = _spec('follower', timeout=0.1)
+	started, release = threading.Event(), threading.Event()
+	leader = threading.Thread(target=lambda : cache.load(spec, lambda : started.set() or release.wait(5) and _frame()))
+	leader.start()
+	started.wait(5)
+	try:
+		with pytest.raises(TimeoutError):
+			cache.load(spec, _frame)
+		breakers.failure(spec.key(), TimeoutError(spec.id))
+		with pytest.raises(stData.DataSourceUnavailable):
+			cache.load(spec, _frame)
+		assert breakers.stats()['rejected'] == 1
+	finally:
+		release.set()
+		leader.join(5)
+
+
+def test_prefetch_survives_load_pool_resizes():
+	handles = [stData.DataSourceHandle(_spec(f'resize{i}', timeout=5), _frame) for i in range(40)]
+	resizer = threading.Thread(target=lambda : [stData.setLoadWorkers(1 + i % 3) for i in range(200)])
+	resizer.start()
+	futures = [handle.prefetch() for handle in handles]
+	resizer.join()
+	try:
+		for future in futures:
+			entry = future.result(timeout=5)
+			assert entry.df.equals(_frame())
+	finally:
+		stData.setLoadWorkers(stData.CONST_DEF_LOAD_WORKERS)
@@ -0,0 +1,43 @@
+import time
+
+import fsspec
+import pandas as pd
+
+import streamlit_diskcache as stDisk
+
+
+def test_remote_object_is_transferred_only_when_it_changes(tmp_path):
+	fsys = fsspec.filesystem('memory')
+	uri = f'/tests/{time.monotonic_ns()}.csv'
+	cache = stDisk.DiskCache(str(tmp_path), stDisk.CONST_BYTES_PER_MB)
+
+	fsys.pipe(uri, b'a,b\n1,2\n')
+	for _ in range(3):
+		with cache.open(fsys, uri, 'rt') as fHndl:
+			assert fHndl.read() == 'a,b\n1,2\n'
+	assert cache.stats()['transfers'] == 1 and cache.stats()['hits'] == 2
+
+	fsys.pipe(uri, b'a,b\n1,2\n3,4\n')
+	with cache.open(fsys, uri, 'rt') as fHndl:
+		assert fHndl.read() == 'a,b\n1,2\n3,4\n'
+	assert cache.stats()['transfers'] == 2
+
+
+def test_local_files_are_not_copied(tmp_path):
+	cache = stDisk.DiskCache(str(tmp_path/'cache'))
+	assert not cache.enabled(fsspec.filesystem('file'))
+	assert cache.enabled(fsspec.filesystem('memory'))
+	assert not stDisk.DiskCache(str(tmp_path), 0).enabled(fsspec.filesystem('memory'))
+
+
+def test_snapshot_round_trip_keeps_the_fetch_time(tmp_path):
+	store = stDisk.SnapshotStore(str(tmp_path))
+	df = pd.DataFrame({'a' : range(5), 'b' : list('abcde')})
+	savedAt = time.time()-3600
+	store.save(('k',), df, savedAt)
+	store.flush()
+
+	restored, restoredAt = store.restore(('k',))
+	assert restored.equals(df)
+	assert abs(restoredAt-savedAt) < 1
+	assert store.restore(('other',)) is None
@@ -0,0 +1,153 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+import streamlit_handlers as stHandlers
+import streamlit_transforms as stTransforms
+
+
+def _painter(**options):
+	return stHandlers.canvasPainterFactory('g_voltage', dict({'id' : 'volt', 'handler' : 'g_voltage', 'x' : 't', 'y' : 'v'}, **options))
+
+
+def test_window_step_is_skipped_when_the_source_window_covers_it():
+	painter = _painter(window={'last' : '24h', 'on' : 't'})
+	assert painter.windowStep() == (stTransforms.CONST_STEP_WINDOW, 't', 86400.0)
+
+	painter.sourceWindow = ('t', 86400.0)
+	assert painter.windowStep() is None
+	painter.sourceWindow = ('t', 7*86400.0)
+	assert painter.windowStep() is not None
+	painter.sourceWindow = ('other', 3600.0)
+	assert painter.windowStep() is not None
+
+
+def test_malformed_window_is_ignored():
+	painter = _painter(window={'last' : '24h'})
+	assert painter.getWindow() is None and painter.windowStep() is None
+	assert painter.requiredColumns() == frozenset(('t', 'v'))
+
+
+def test_aggregate_keeps_the_painted_columns():
+	painter = stHandlers.canvasPainterFactory('g_wind', {'id' : 'w', 'handler' : 'g_wind', 'timeStampName' : 't',
+														'windSpeedName' : 's', 'windDirectionName' : 'd', 'resample' : '1h'})
+	_, on, freq, by, agg, keep = painter.aggregateStep()
+	assert (on, freq, by, agg, keep) == ('t', '1h', (), (), ('d', 's', 't'))
+
+
+def test_resample_without_an_x_is_ignored():
+	painter = stHandlers.canvasPainterFactory('default_graph', {'id' : 'b', 'handler' : 'default_graph', 'y' : 'v', 'resample' : '1h'})
+	assert painter.aggregateStep() is None
+
+
+_VOLTAGE = {'id' : 'volt', 'handler' : 'g_voltage', 'x' : 't', 'y' : 'v', 'control-line-const-value' : 4, 'control-line-type' : 'dot'}
+
+
+def test_figure_cache_reuses_output_per_data_version(monkeypatch):
+	monkeypatch.setattr(stHandlers, 'g_figureCache', stHandlers.FigureCache())
+	canvas = _VOLTAGE
+	df = pd.DataFrame({'t' : np.arange(100), 'v' : np.random.default_rng(1).random(100)})
+
+	first = stHandlers.buildCanvas(canvas, df, 'v1')
+	assert first is not None
+	assert stHandlers.buildCanvas(canvas, df, 'v1') is first
+	assert stHandlers.buildCanvas(dict(canvas, title='changed'), df, 'v1') is not first
+	assert stHandlers.buildCanvas(canvas, df, 'v2') is not first
+	assert stHandlers.g_figureCache.stats()['hits'] == 1
+
+
+def test_figure_cache_is_skipped_for_data_without_a_version(monkeypatch):
+	monkeypatch.setattr(stHandlers, 'g_figureCache', stHandlers.FigureCache())
+	canvas = _VOLTAGE
+	df = pd.DataFrame({'t' : np.arange(100), 'v' : np.arange(100.0)})
+
+	first = stHandlers.buildCanvas(canvas, df)
+	assert stHandlers.buildCanvas(canvas, df.iloc[:10]) is not first
+	assert stHandlers.g_figureCache.stats()['entries'] == 0
+
+
+def _wind(**options):
+	return stHandlers.canvasPainterFactory('g_wind', dict({'id' : 'wind', 'handler' : 'g_wind', 'timeStampName' : 't',
+														   'windSpeedName' : 'speed', 'windDirectionName' : 'dir', 'timeStampLabel' : 'Time',
+														   'windSpeedLabel' : 'Speed', 'windDirectionLabel' : 'Direction'}, **options))
+
+
+def test_wind_arrows_are_a_single_trace():
+	df = pd.DataFrame({'t' : pd.date_range('2024-01-01', periods=500, freq='min'),
+					   'speed' : np.arange(500.0), 'dir' : np.arange(500.0) % 360})
+	for painter, arrows in ((_wind(), 500), (_wind(maxArrows=50), 50)):
+		output = stHandlers.CanvasOutput()
+		assert painter.render(df, output)
+		figure = output.calls[0][1][0]
+		assert len(figure.data) == 2		# the speed line and one marker trace for every arrow
+		assert len(figure.data[1].marker.angle) == arrows
+
+
+def test_prepare_leaves_the_cached_frame_alone(monkeypatch):
+	import streamlit_datasources as stData
+
+	monkeypatch.setattr(stTransforms, 'g_transformMemo', stTransforms.TransformMemo())
+	cached = pd.DataFrame({'t' : pd.date_range('2024-01-01', periods=50, freq='min').strftime('%Y-%m-%d %H:%M'),
+						   'speed' : np.arange(50.0), 'dir' : np.arange(50.0)})
+	original = cached.copy()
+	entry = stData.DataSourceEntry(('wind',), cached, 60, 1)
+	painter = _wind(**{'idx-field-date-format' : '%Y-%m-%d %H:%M', 'sortOnCol' : 't', 'head' : 10})
+	painter.dataVersion = entry.version
+
+	df = painter.prepare(entry.view())
+	assert pd.api.types.is_datetime64_any_dtype(df['t']) and len(df) == 10
+	assert painter.prepare(entry.view()) is df		# the timestamps are parsed once per data version
+	view = entry.view()
+	view.loc[0, 'speed'] = -1.0
+	assert entry.df.equals(original)
+
+
+def test_factory_builds_the_registered_painter():
+	assert isinstance(stHandlers.canvasPainterFactory('g_wind', {}), stHandlers.WindGraphPainter)
+	assert isinstance(stHandlers.canvasPainterFactory('no_such_painter', {}), stHandlers.DefaultPainter)
+
+
+def test_registered_painters_are_not_replaced_by_accident(monkeypatch):
+	monkeypatch.setattr(stHandlers, 'g_painters', dict(stHandlers.g_painters))
+
+	class CustomPainter(stHandlers.DefaultPainter):
+		pass
+
+	assert stHandlers.registerPainter('custom', CustomPainter)
+	assert not stHandlers.registerPainter('g_wind', CustomPainter)
+	assert isinstance(stHandlers.canvasPainterFactory('g_wind', {}), stHandlers.WindGraphPainter)
+	assert stHandlers.registerPainter('g_wind', CustomPainter, overwrite=True)
+	assert isinstance(stHandlers.canvasPainterFactory('g_wind', {}), CustomPainter)
+
+
+def test_entry_points_are_read_once_and_only_for_an_unknown_painter(monkeypatch):
+	monkeypatch.setattr(stHandlers, 'g_painters', dict(stHandlers.g_painters))
+	monkeypatch.setattr(stHandlers, 'g_entryPointsLoaded', False)
+	reads = []
+
+	class EntryPoint:
+		name, value = 'plugin', 'plugin:Painter'
+		def load(self):
+			return stHandlers.BasicGraphPainter
+
+	def entryPoints(group):
+		reads.append(group)
+		return [EntryPoint()]
+
+	monkeypatch.setattr(stHandlers.importlib.metadata, 'entry_points', entryPoints)
+	stHandlers.canvasPainterFactory('g_wind', {})
+	assert reads == []
+	assert isinstance(stHandlers.canvasPainterFactory('plugin', {}), stHandlers.BasicGraphPainter)
+	stHandlers.canvasPainterFactory('still_unknown', {})
+	assert reads == [stHandlers.CONST_PAINTER_ENTRY_POINTS]
+
+
+def test_plotly_express_is_imported_by_the_first_render_not_the_module():
+	script = 'import sys, streamlit_handlers; print("plotly.express" in sys.modules)'
+	run = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+						 cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+	assert run.returncode == 0, run.stderr
+	assert run.stdout.split()[-1] == 'False'
@@ -0,0 +1,61 @@
+import time
+from types import SimpleNamespace
+
+import streamlit_helper as stHelper
+import streamlit_datasources as stData
+import streamlit_handlers as stHandlers
+
+
+def _spec(columns):
+	return stData.DataSourceSpec('wind', 'memory', 'memory://wind.csv', 'csv', 60, 1, None, None, columns)
+
+
+def test_page_data_source_follows_the_spec_of_the_page():
+	first, second = _spec(frozenset({'Ts', 'Speed'})), _spec(frozenset({'Ts', 'Direction'}))
+	assert first.key() != second.key()
+	stHelper.addDataSource(first.key(), 'first', overwrite=True)
+	stHelper.addDataSource(second.key(), 'second', overwrite=True)
+
+	stHelper.usePageDataSources({'wind': first.key()})
+	assert stHelper.pageDataSource('wind') == 'first'
+	stHelper.usePageDataSources({'wind': second.key()})
+	assert stHelper.pageDataSource('wind') == 'second'
+	assert stHelper.pageDataSource('missing') is None
+
+
+def _layout(*ids):
+	canvases = [SimpleNamespace(id=id, configuration={'id' : id}, dataSource=None, refresh=0) for id in ids]
+	return SimpleNamespace(renderOrder=lambda : [SimpleNamespace(canvas=canvas) for canvas in canvases]), canvases
+
+
+def test_prepared_canvases_are_replayed_in_layout_order(monkeypatch):
+	emitted = []
+	finished = []
+
+	def build(configuration, df, version, window):
+		# the first canvas in the layout takes longest to build
+		time.sleep({'a' : 0.15, 'b' : 0.05, 'c' : 0.0}[configuration['id']])
+		finished.append(configuration['id'])
+		output = stHandlers.CanvasOutput()
+		output.write(configuration['id'])
+		return output
+
+	monkeypatch.setattr(stHelper, 'buildCanvas', build)
+	monkeypatch.setattr(stHelper, 'st', SimpleNamespace(write=emitted.append))
+	plan, canvases = _layout('a', 'b', 'c')
+
+	assert stHelper.uxPrepareCanvases(plan) == 3
+	for canvas in canvases:
+		assert stHelper.uxCanvasContents(canvas)
+	assert finished == ['c', 'b', 'a']
+	assert emitted == ['a', 'b', 'c']
+	assert stHelper.uxDiscardPrebuilt() == 0
+
+
+def test_unrendered_builds_are_discarded(monkeypatch):
+	monkeypatch.setattr(stHelper, 'buildCanvas', lambda *args : stHandlers.CanvasOutput())
+	plan, canvases = _layout('a', 'b')
+
+	assert stHelper.uxPrepareCanvases(plan) == 2
+	assert stHelper.uxDiscardPrebuilt() == 2
+	assert stHelper.uxDiscardPrebuilt() == 0
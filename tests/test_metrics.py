@@ -0,0 +1,62 @@
+import socket
+
+import vwmetrics
+
+
+def test_histogram_exposition_and_summary():
+	registry = vwmetrics.MetricsRegistry(prefix='t')
+	latency = registry.histogram('seconds', 'latency', buckets=(0.1, 1.0))
+	for val in (0.05, 0.5, 0.5, 5.0):
+		latency.observe(val, canvas='a')
+	registry.counter('calls_total', 'calls').inc(2, canvas='a')
+	registry.collector('cache', lambda : {'hits' : 3, 'root' : '/tmp', 'on' : True})
+
+	text = registry.exposition()
+	assert 't_seconds_bucket{canvas="a",le="0.1"} 1' in text
+	assert 't_seconds_bucket{canvas="a",le="1.0"} 3' in text
+	assert 't_seconds_bucket{canvas="a",le="+Inf"} 4' in text
+	assert 't_calls_total{canvas="a"} 2.0' in text
+	assert 't_cache_hits 3.0' in text and 'root' not in text and 't_cache_on' not in text
+
+	summary = latency.summary()[(('canvas', 'a'),)]
+	assert summary['count'] == 4 and summary['p50'] == 1.0 and summary['p95'] == float('inf')
+
+
+def test_serveHttp_survives_a_busy_port(monkeypatch):
+	monkeypatch.setattr(vwmetrics, 'g_server', None)
+	with socket.socket() as busy:
+		busy.bind((vwmetrics.CONST_DEF_HTTP_HOST, 0))
+		busy.listen()
+		assert not vwmetrics.serveHttp(busy.getsockname()[1])
+	assert vwmetrics.g_server is None
+
+
+def test_serveHttp_binds_the_given_host(monkeypatch):
+	import urllib.request
+
+	monkeypatch.setattr(vwmetrics, 'g_server', None)
+	assert vwmetrics.serveHttp(0, host='0.0.0.0')
+	try:
+		host, port = vwmetrics.g_server.server_address[:2]
+		assert host == '0.0.0.0'
+		with urllib.request.urlopen(f'http://127.0.0.1:{port}{vwmetrics.CONST_METRICS_PATH}', timeout=5) as response:
+			assert response.status == 200
+	finally:
+		vwmetrics.g_server.shutdown()
+		vwmetrics.g_server.server_close()
+
+
+def test_function_report_is_derived_from_function_seconds():
+	import vwlogger
+
+	@vwlogger.performance
+	def reportedFunction():
+		return 1
+
+	for _ in range(3):
+		reportedFunction()
+	name = f'{reportedFunction.__module__}.{reportedFunction.__qualname__}'
+	summary = vwlogger.g_functionSeconds.summary()[(('function', name),)]
+	assert summary['count'] == 3 and sum(summary['buckets']) == 3
+	assert any(line.startswith(f'{name} calls:3 ') for line in vwlogger.histogramReport().splitlines())
+	assert not hasattr(vwlogger.g_spans, 'histogram')
@@ -0,0 +1,74 @@
+import json
+import os
+
+import streamlit_plan as stPlan
+
+
+def _page(window=None):
+	canvas = {'id' : 'volt', 'handler' : 'g_voltage', 'data-source' : 'meteo', 'x' : 'Timestamp_UTC', 'y' : 'Voltage'}
+	if window is not None:
+		canvas['window'] = window
+	return {'en' : {'title' : 'T',
+					'Site' : {'Containers' : [{'id' : 'c1', 'canvas' : 'volt', 'height' : 100}]},
+					'Resources' : {'DataSources' : [{'id' : 'meteo'}, {'id' : 'unused'}],
+								   'Canvas' : [canvas]}}}
+
+
+def _write(path, page):
+	with open(path, 'w') as fHndl:
+		json.dump(page, fHndl)
+
+
+def test_plan_is_compiled_once_per_file_version(tmp_path):
+	path = str(tmp_path/'page.json')
+	_write(path, _page())
+	cache = stPlan.PlanCache()
+
+	first = cache.page(path)
+	assert cache.page(path) is first
+	assert first.title == 'T'
+
+	page = _page()
+	page['en']['title'] = 'Changed title'
+	_write(path, page)
+	stat = os.stat(path)
+	os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns+1000000))
+
+	second = cache.page(path)
+	assert second is not first
+	assert second.title == 'Changed title'
+	assert cache.compiles == 4		# the json and its plan, twice
+
+
+def test_plan_keeps_only_the_reachable_sources(tmp_path):
+	path = str(tmp_path/'page.json')
+	_write(path, _page())
+	plan = stPlan.PlanCache().page(path)
+
+	assert [ds.id for ds in plan.dataSources] == ['meteo']
+	assert [container.id for container in plan.renderOrder()] == ['c1']
+
+
+def test_plan_projects_each_source_onto_its_canvas_columns(tmp_path):
+	path = str(tmp_path/'page.json')
+	_write(path, _page())
+	plan = stPlan.PlanCache().page(path)
+
+	assert plan.dataSources[0].columns == frozenset(('Timestamp_UTC', 'Voltage'))
+
+
+def test_malformed_canvas_window_is_ignored(tmp_path):
+	path = str(tmp_path/'page.json')
+	_write(path, _page(window={'last' : '24h'}))
+	plan = stPlan.PlanCache().page(path)
+
+	assert plan.dataSources[0].window is None
+	assert plan.dataSources[0].columns == frozenset(('Timestamp_UTC', 'Voltage'))
+
+
+def test_canvas_windows_are_pushed_to_their_source(tmp_path):
+	path = str(tmp_path/'page.json')
+	_write(path, _page(window={'last' : '24h', 'on' : 'Timestamp_UTC'}))
+	plan = stPlan.PlanCache().page(path)
+
+	assert plan.dataSources[0].window == ('Timestamp_UTC', 86400.0)
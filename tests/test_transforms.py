@@ -0,0 +1,155 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import streamlit_transforms as stTransforms
+
+
+def test_minMaxIndex_keeps_bucket_extremes():
+	y = np.sin(np.linspace(0, 20, 10000))
+	y[4321] = 50.0
+	y[8765] = -50.0
+	idx = stTransforms.minMaxIndex(y, 100)
+	assert len(idx) <= 100
+	assert 4321 in idx and 8765 in idx
+
+
+def test_lttbIndex_keeps_ends_and_spike():
+	n = 5000
+	x = np.arange(n, dtype=np.float64)
+	y = np.zeros(n)
+	y[2500] = 10.0
+	idx = stTransforms.lttbIndex(x, y, 200)
+	assert len(idx) == 200
+	assert idx[0] == 0 and idx[-1] == n-1
+	assert np.all(np.diff(idx) >= 0)
+	assert 2500 in idx
+
+
+def test_lttbIndex_returns_every_row_when_points_cover_them():
+	idx = stTransforms.lttbIndex(np.arange(10.0), np.arange(10.0), 20)
+	assert list(idx) == list(range(10))
+
+
+@pytest.mark.parametrize('ys', [('label',), ('absent',), ()])
+def test_downsampleRows_leaves_df_alone_when_no_series_is_numeric(ys):
+	df = pd.DataFrame({'t' : np.arange(5000), 'label' : ['a', 'b'] * 2500})
+	assert stTransforms.downsampleIndex(df['t'], [df[c] for c in ys if c in df], 100) is None
+	assert stTransforms.downsampleRows(df, 't', ys, 100, stTransforms.CONST_DS_MINMAX) is df
+
+
+@pytest.mark.parametrize('values', [np.random.default_rng(3).integers(0, 20, 500),
+									np.where(np.arange(500) % 7 == 0, np.nan, np.random.default_rng(4).random(500)),
+									pd.date_range('2024-01-01', periods=500, freq='h')[np.random.default_rng(5).permutation(500)],
+									np.random.default_rng(6).choice(list('abcde'), 500),
+									np.arange(500) % 3 == 0])
+@pytest.mark.parametrize('ascending', [True, False])
+def test_topRows_matches_a_stable_sort(values, ascending):
+	df = pd.DataFrame({'k' : values, 'i' : np.arange(500)})
+	expected = df.sort_values(by=['k'], ascending=ascending, kind='stable').head(25)
+	assert stTransforms.topRows(df, 'k', ascending, 25).equals(expected)
+
+
+def test_memo_coalesces_concurrent_builds():
+	memo = stTransforms.TransformMemo()
+	started, release = threading.Event(), threading.Event()
+	calls = []
+
+	def build():
+		calls.append(1)
+		started.set()
+		release.wait(5)
+		return 'frame'
+
+	results = []
+	leader = threading.Thread(target=lambda : results.append(memo.get(('k',), build)))
+	leader.start()
+	started.wait(5)
+	follower = threading.Thread(target=lambda : results.append(memo.get(('k',), build)))
+	follower.start()
+	while memo.stats()['coalesced'] == 0:
+		time.sleep(0.01)
+	release.set()
+	leader.join(5)
+	follower.join(5)
+
+	assert results == ['frame', 'frame']
+	assert len(calls) == 1
+	assert memo.stats()['misses'] == 1 and memo.stats()['coalesced'] == 1
+
+
+def test_memo_counts_saved_time_and_forgets_failed_builds():
+	memo = stTransforms.TransformMemo()
+	memo.get(('k',), lambda : time.sleep(0.02) or 'frame')
+	assert memo.get(('k',), lambda : pytest.fail('rebuilt')) == 'frame'
+	assert memo.stats()['savedSeconds'] >= 0.02
+
+	with pytest.raises(ZeroDivisionError):
+		memo.get(('bad',), lambda : 1/0)
+	assert memo.get(('bad',), lambda : 'retried') == 'retried'
+
+
+def test_applyTransforms_shares_leading_steps():
+	memo = stTransforms.TransformMemo()
+	df = pd.DataFrame({'t' : pd.date_range('2024-01-01', periods=1000, freq='min'), 'v' : np.arange(1000.0)})
+	order = (stTransforms.CONST_STEP_ORDER, 't', False, 100)
+	a = stTransforms.applyTransforms(df, 1, (order, (stTransforms.CONST_STEP_DOWNSAMPLE, 't', ('v',), 10, 'minmax')), memo)
+	b = stTransforms.applyTransforms(df, 1, (order, (stTransforms.CONST_STEP_DOWNSAMPLE, 't', ('v',), 20, 'minmax')), memo)
+	assert len(a) <= 12 and len(b) <= 22
+	assert memo.stats()['hits'] == 1 and memo.stats()['misses'] == 3
+
+
+def _minutes():
+	return pd.DataFrame({'t' : pd.date_range('2024-01-01', periods=120, freq='min'),
+						 's' : np.arange(120.0),
+						 'd' : ['N', 'S']*60})
+
+
+def test_aggregateRows_resamples_numeric_columns_by_default():
+	out = stTransforms.aggregateRows(_minutes(), 't', '1h', (), ())
+	assert list(out.columns) == ['t', 's']
+	assert list(out['s']) == [29.5, 89.5]
+
+
+def test_aggregateRows_names_columns_per_function():
+	out = stTransforms.aggregateRows(_minutes(), 't', '1h', (), (('s', ('mean', 'max')),))
+	assert list(out.columns) == ['t', stTransforms.aggregateName('s', 'mean'), stTransforms.aggregateName('s', 'max')]
+	assert list(out[stTransforms.aggregateName('s', 'max')]) == [59.0, 119.0]
+
+
+def test_aggregateRows_keeps_painter_columns_with_last():
+	out = stTransforms.aggregateRows(_minutes(), 't', '1h', (), (), keep=('s', 'd'))
+	assert list(out.columns) == ['t', 's', 'd']
+	assert list(out['d']) == ['S', 'S']
+
+
+def test_aggregateRows_groupby_without_resample():
+	out = stTransforms.aggregateRows(_minutes(), None, None, ('d',), (('s', ('max',)),))
+	assert dict(zip(out['d'], out['s'])) == {'N' : 118.0, 'S' : 119.0}
+
+
+def test_aggregateRows_rejects_a_non_datetime_resample_column():
+	with pytest.raises(ValueError):
+		stTransforms.aggregateRows(_minutes(), 's', '1h', (), ())
+
+
+def test_windowSpec():
+	assert stTransforms.windowSpec({'last' : '24h', 'on' : 't'}) == ('t', 86400.0)
+	assert stTransforms.windowSpec(None) is None
+	with pytest.raises(ValueError):
+		stTransforms.windowSpec({'last' : '24h'})
+
+
+def test_windowRows_naive_aware_and_text():
+	now = pd.Timestamp.now(tz='UTC')
+	stamps = pd.Series([now-pd.Timedelta(hours=h) for h in (48, 30, 12, 1)])
+	aware = pd.DataFrame({'t' : stamps, 'v' : range(4)})
+	naive = aware.assign(t=stamps.dt.tz_localize(None))
+	text = naive.assign(t=naive['t'].dt.strftime('%Y-%m-%d %H:%M:%S'))
+
+	for df, fmt in ((aware, None), (naive, None), (text, '%Y-%m-%d %H:%M:%S')):
+		assert list(stTransforms.windowRows(df, 't', 86400, fmt)['v']) == [2, 3]
+	assert len(stTransforms.windowRows(naive, 'missing', 86400)) == 4
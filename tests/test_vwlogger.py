@@ -0,0 +1,144 @@
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import vwlogger
+
+
+def test_bad_env_warns_without_adding_a_root_handler():
+	env = dict(os.environ, VWLOGGER_LEVEL='bogus', VWLOGGER_SAMPLE='uxCanvas=often')
+	script = 'import logging, vwlogger; print(len(logging.getLogger().handlers), vwlogger.CONST_DEF_LOGLEVEL)'
+	run = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True,
+						 cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+	assert run.returncode == 0, run.stderr
+	assert run.stdout.split()[-2:] == ['0', '10']
+	assert 'ignoring unknown log level bogus' in run.stderr
+	assert 'ignoring sample rate uxCanvas=often' in run.stderr
+
+
+def test_spans_nest_and_export_as_a_chrome_trace(tmp_path):
+	@vwlogger.performance
+	def inner():
+		vwlogger.spanTag(rows=3)
+
+	@vwlogger.performance
+	def outer():
+		inner()
+		inner()
+
+	since = time.time()
+	outer()
+	spans = vwlogger.g_spans.spans(since)
+	parent = next(span for span in spans if span.name.endswith('.outer'))
+	children = [span for span in spans if span.name.endswith('.inner')]
+	assert len(children) == 2
+	assert all(span.parent == parent.id and span.args == {'rows' : 3} for span in children)
+	assert parent.duration >= sum(span.duration for span in children)
+
+	path = str(tmp_path/'trace.json')
+	assert vwlogger.g_spans.exportChromeTrace(path, since) == len(spans)
+	with open(path) as fHndl:
+		events = [event for event in json.load(fHndl)['traceEvents'] if event['ph'] == 'X' and event['name'].endswith('.inner')]
+	assert len(events) == 2
+	assert events[0]['args']['parent'] == parent.id and events[0]['args']['rows'] == 3
+
+
+def test_sampling_records_one_call_in_n(monkeypatch):
+	@vwlogger.performance
+	def sampledCall():
+		return 1
+
+	monkeypatch.setitem(vwlogger.g_sampleRates, sampledCall.__name__, 0.25)
+	since = time.time()
+	assert [sampledCall() for _ in range(8)] == [1]*8
+	assert len([span for span in vwlogger.g_spans.spans(since) if span.name.endswith('.sampledCall')]) == 2
+
+	monkeypatch.setitem(vwlogger.g_sampleRates, sampledCall.__name__, 0)
+	sampledCall()
+	assert len([span for span in vwlogger.g_spans.spans(since) if span.name.endswith('.sampledCall')]) == 2
+
+
+def test_trace_only_formats_arguments_that_are_logged(monkeypatch):
+	formatted = []
+
+	class Arg:
+		def __repr__(self):
+			formatted.append(1)
+			return 'arg'
+
+	class Formatting(vwlogger.logging.Handler):
+		def emit(self, record):
+			record.getMessage()
+
+	@vwlogger.trace
+	def traced(arg):
+		return arg
+
+	monkeypatch.setattr(vwlogger.logging.root, 'handlers', [Formatting()])
+	level = vwlogger.logging.root.level
+	try:
+		vwlogger.logging.root.setLevel(vwlogger.logging.WARNING)
+		traced(Arg())
+		assert formatted == []
+
+		vwlogger.logging.root.setLevel(vwlogger.logging.INFO)
+		traced(Arg())
+		assert formatted == [1]
+	finally:
+		vwlogger.logging.root.setLevel(level)
+
+
+def test_disabled_decorators_return_the_function_untouched():
+	script = 'import vwlogger; f = lambda : 1; print(vwlogger.performance(f) is f and vwlogger.trace(f) is f)'
+	run = subprocess.run([sys.executable, '-c', script], env=dict(os.environ, VWLOGGER_DISABLE='1'), capture_output=True, text=True,
+						 cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+	assert run.returncode == 0, run.stderr
+	assert run.stdout.split()[-1] == 'True'
+
+
+def _queued(handler, count):
+	logger = logging.getLogger(f'tests.queue.{handler.dropPolicy}')
+	logger.propagate = False
+	logger.handlers = [handler]
+	for i in range(count):
+		logger.warning(f'record {i}')
+	return [handler.queue.get_nowait().getMessage() for _ in range(handler.queue.qsize())]
+
+
+def test_full_queue_drops_the_newest_and_reports_it():
+	handler = vwlogger.BoundedQueueHandler(2, vwlogger.CONST_DROP_NEWEST)
+	assert _queued(handler, 5) == ['record 0', 'record 1']
+	assert handler.dropped == 3
+	assert _queued(handler, 1) == ['record 0', '3 log records dropped, the log queue was full (drop-newest)']
+
+
+def test_full_queue_drops_the_oldest():
+	handler = vwlogger.BoundedQueueHandler(2, vwlogger.CONST_DROP_OLDEST)
+	assert _queued(handler, 5)[-1] == 'record 4'
+	assert handler.dropped >= 3
+
+
+def test_setupLogging_routes_records_through_the_queue(monkeypatch):
+	monkeypatch.setattr(vwlogger, 'g_listener', None)
+	stream = io.StringIO()
+	level = logging.root.level
+	assert vwlogger.setupLogging(logging.INFO, '%(threadName)s %(message)s', stream=stream)
+	try:
+		assert not vwlogger.setupLogging()
+		logging.info('through the queue')
+	finally:
+		vwlogger.stopLogging()
+		logging.root.setLevel(level)
+	assert stream.getvalue() == f'{threading.current_thread().name} through the queue\n'
+
+
+def test_unknown_drop_policy_is_rejected():
+	with pytest.raises(ValueError):
+		vwlogger.BoundedQueueHandler(2, 'drop-all')
@@ -3,16 +3,58 @@
 # ========================================================
 # CB 	1/3/2024	See Below					1.3
 # 					Ref: 001 : time output to be 9.99 seconds. 
+# 					1.4 : performance records nested spans, Ref: 002
+# 					1.5 : lazy trace arguments, sampling and VWLOGGER_DISABLE, Ref: 003
+# 					1.6 : setupLogging, queue backed logging off the render thread, Ref: 004
+# 					1.7 : performance feeds the vwmetrics registry, Ref: 005
 
+import os
+import sys
+import json
 import time
+import queue
+import atexit
+import threading
+import reprlib
+import itertools
 from typing import Final
 import argparse 
 import logging
+import vwmetrics
+from collections import deque
 from functools import wraps
+from logging.handlers import QueueHandler, QueueListener
 
-CONST_VER 			: Final[str]	= '1.3'
+CONST_VER 			: Final[str]	= '1.7'
 
-CONST_DEF_LOGLEVEL	: Final[int]	= logging.DEBUG
+CONST_ENV_DISABLE	: Final[str]	= 'VWLOGGER_DISABLE'	# 1/true/yes/on : trace and performance return the function untouched
+CONST_ENV_SAMPLE	: Final[str]	= 'VWLOGGER_SAMPLE'		# name=rate,... e.g. 'uxCanvas=0.01,getOptStr=0,*=1'
+CONST_ENV_LEVEL		: Final[str]	= 'VWLOGGER_LEVEL'		# DEBUG, INFO, WARNING...
+CONST_ENV_PAYLOADS	: Final[str]	= 'VWLOGGER_DEBUG_PAYLOADS'	# 1/true/yes/on : log DataFrames and whole configs at DEBUG
+CONST_ENV_QUEUE		: Final[str]	= 'VWLOGGER_QUEUE_SIZE'
+CONST_ENV_DROP		: Final[str]	= 'VWLOGGER_DROP_POLICY'
+CONST_ENV_TRUE		: Final[tuple]	= ('1', 'true', 'yes', 'on')
+CONST_SAMPLE_ALL	: Final[str]	= '*'
+CONST_ARGS_PREVIEW	: Final[int]	= 60
+CONST_DEF_QUEUE_SIZE: Final[int]	= 10000
+CONST_DROP_NEWEST	: Final[str]	= 'drop-newest'		# a full queue discards the record being logged
+CONST_DROP_OLDEST	: Final[str]	= 'drop-oldest'		# ... discards the oldest queued record to make room
+CONST_DROP_BLOCK	: Final[str]	= 'block'			# ... makes the logging thread wait, nothing is lost
+CONST_DROP_POLICIES	: Final[tuple]	= (CONST_DROP_NEWEST, CONST_DROP_OLDEST, CONST_DROP_BLOCK)
+
+# the env is read at import, before setupLogging, so warn through this module's logger -
+# a root logging.warning here would run basicConfig and every record would then print twice
+g_log = logging.getLogger(__name__)
+
+def _parseLevel( name : str ) -> int :
+	# getLevelName maps an unknown name to the string 'Level <NAME>' rather than failing
+	level = logging.getLevelName(name.upper())
+	if not isinstance(level, int):
+		g_log.warning(f'ignoring unknown log level {name} from {CONST_ENV_LEVEL}, using DEBUG')
+		return logging.DEBUG
+	return level
+
+CONST_DEF_LOGLEVEL	: Final[int]	= _parseLevel(os.environ.get(CONST_ENV_LEVEL, 'DEBUG'))
 CONST_LOGGING_FMT 	: Final[str]	= '[%(levelname)s][%(asctime)s][%(thread)d:%(threadName)s][%(module)s.%(funcName)s]-%(message)s'
 CONST_STR_EXEC_MSG 	: Final[str]	= 'execution time '
 CONST_STR_STARTED 	: Final[str]	= 'Started'
@@ -21,27 +63,322 @@ CONST_STR_SEP 		: Final[str]	= ':'
 CONST_STR_EXEC_TIME : Final[str]	= 'execution Time'
 CONST_DEF_TESTMSG	: Final[str]	= 'this is a test message'
 CONST_STR_ARROW		: Final[str]	= '>'
+CONST_DEF_SPAN_BUFFER	: Final[int]	= 20000		# finished spans kept for export, oldest dropped first
+CONST_ENV_TRACE_DIR		: Final[str]	= 'VWLOGGER_TRACE_DIR'	# set to write a Chrome trace per rerun into this directory
+
+
+def _parseRates( spec : str ) -> dict :
+	rates = {}
+	for item in spec.split(','):
+		if '=' in item:
+			nom, rate = item.split('=', 1)
+			try:
+				rates[nom.strip()] = float(rate)
+			except ValueError:
+				g_log.warning(f'ignoring sample rate {item} from {CONST_ENV_SAMPLE}')
+	return rates
+
+g_disabled		= os.environ.get(CONST_ENV_DISABLE, '').lower() in CONST_ENV_TRUE
+g_sampleRates	= _parseRates(os.environ.get(CONST_ENV_SAMPLE, ''))
+
+def setSampleRate( nom : str, rate : float ) -> None:
+	"""Instrument 1 in 1/rate calls of nom (func name, module.qualname or '*'), 0 for none."""
+	g_sampleRates[nom] = rate
+
+def _sampler( func ):
+	"""A per function 'record this call?' test. Every decorator of a function counts its
+	calls in step, so trace and performance always pick the same calls."""
+	names = (f'{func.__module__}.{func.__qualname__}', func.__name__, CONST_SAMPLE_ALL)
+	counter = itertools.count()
+	def sampled() -> bool:
+		rate = next((g_sampleRates[nom] for nom in names if nom in g_sampleRates), 1.0)
+		if rate >= 1:
+			return True
+		if rate <= 0:
+			return False
+		return next(counter) % round(1/rate) == 0
+	return sampled
+
+
+class _ArgsRepr(reprlib.Repr):
+	"""Bounded repr, big containers are cut off while they are walked rather than after."""
+	def __init__(self):
+		super().__init__()
+		self.maxlevel	= 2
+		self.maxdict	= 4
+		self.maxlist	= 4
+		self.maxtuple	= 4
+		self.maxstring	= 40
+		self.maxother	= 40
+
+	def repr_DataFrame(self, x, level):
+		return f'<DataFrame {x.shape[0]}x{x.shape[1]}>'
+
+	def repr_Series(self, x, level):
+		return f'<Series {x.name} {len(x)}>'
+
+g_argsRepr = _ArgsRepr()
+
+class _ArgsPreview:
+	"""Formats the call arguments only if the log record is actually emitted."""
+	__slots__ = ('args',)
+	def __init__(self, args):
+		self.args = args
+	def __str__(self):
+		return g_argsRepr.repr(self.args)[:CONST_ARGS_PREVIEW]
 
 
 def trace(func):
-    @wraps(func)
-    def trace_wrapper(*args, **kwargs):
-        logging.info(f"{CONST_STR_ARROW}[{func.__name__}]{CONST_STR_SEP}{CONST_STR_STARTED} {CONST_STR_SEP} {args.__str__():.60}..")
-        ret = func(*args, **kwargs)
-        logging.info(f"{CONST_STR_ARROW}[{func.__name__}]{CONST_STR_SEP}{CONST_STR_END}")
-        return ret
-    return trace_wrapper
+	if g_disabled:
+		return func
+	sampled = _sampler(func)
+	@wraps(func)
+	def trace_wrapper(*args, **kwargs):
+		#Ref 003
+		if not sampled() or not logging.root.isEnabledFor(logging.INFO):
+			return func(*args, **kwargs)
+		logging.info("%s[%s]%s%s %s %s..", CONST_STR_ARROW, func.__name__, CONST_STR_SEP, CONST_STR_STARTED, CONST_STR_SEP, _ArgsPreview(args))
+		ret = func(*args, **kwargs)
+		logging.info("%s[%s]%s%s", CONST_STR_ARROW, func.__name__, CONST_STR_SEP, CONST_STR_END)
+		return ret
+	return trace_wrapper
+
+class Span:
+	"""One timed call, parent is the id of the span it ran inside on the same thread (None at the top)."""
+	__slots__ = ('id', 'parent', 'name', 'thread', 'threadName', 'session', 'start', 'duration', 'args')
+
+	def __init__(self, id : int, parent : int, name : str, session):
+		self.id			= id
+		self.parent		= parent
+		self.name		= name
+		self.session	= session
+		self.thread		= threading.get_ident()
+		self.threadName	= threading.current_thread().name
+		self.start		= time.time()
+		self.duration	= None
+		self.args		= None
+
+
+class SpanRecorder:
+	"""Collects the spans the performance decorator opens, per thread, as a tree.
+
+	Finished spans go into a bounded buffer for export, their timings are kept by
+	the function_seconds histogram (see histogramReport). sessionProvider, when set,
+	is called to tag each span with the session it ran for.
+	"""
+
+	def __init__(self, maxSpans : int = CONST_DEF_SPAN_BUFFER):
+		self.sessionProvider	= None
+		self._spans				= deque(maxlen=maxSpans)
+		self._ids				= itertools.count(1)
+		self._local				= threading.local()
+		self._lock				= threading.Lock()
+
+	def _stack(self) -> list:
+		stack = getattr(self._local, 'stack', None)
+		if stack is None:
+			stack = self._local.stack = []
+		return stack
+
+	def _session(self):
+		try:
+			return None if self.sessionProvider is None else self.sessionProvider()
+		except Exception:
+			return None
+
+	def begin(self, name : str) -> Span:
+		stack = self._stack()
+		span = Span(next(self._ids), stack[-1][0].id if len(stack)>0 else None, name, self._session())
+		stack.append((span, time.perf_counter()))
+		return span
+
+	def end(self, span : Span) -> None:
+		stack = self._stack()
+		while len(stack)>0:
+			top, started = stack.pop()
+			if top is span:
+				span.duration = time.perf_counter()-started
+				break
+
+		with self._lock:
+			self._spans.append(span)
+
+	def current(self) -> Span:
+		stack = self._stack()
+		return stack[-1][0] if len(stack)>0 else None
+
+	def tag(self, **kwargs) -> None:
+		"""Attach kwargs to the innermost open span of this thread, they show up as its args in the export."""
+		span = self.current()
+		if span is not None:
+			span.args = {**(span.args or {}), **kwargs}
+
+	def spans(self, since : float = None, session = None) -> list:
+		with self._lock:
+			spans = list(self._spans)
+		return [span for span in spans if (since is None or span.start >= since) and (session is None or span.session in (session, None))]
+
+	def chromeTrace(self, spans : list) -> dict:
+		"""spans as Chrome trace-event JSON (loads in chrome://tracing and Perfetto), a process per session."""
+		pids, events = {}, []
+		for span in spans:
+			if span.session not in pids:
+				pids[span.session] = len(pids)+1
+				events.append({'ph' : 'M', 'name' : 'process_name', 'pid' : pids[span.session], 'tid' : 0,
+							   'args' : {'name' : 'background' if span.session is None else f'session {span.session}'}})
+			events.append({'ph' : 'X', 'name' : span.name, 'cat' : span.name.split('.')[0],
+						   'ts' : span.start*1e6, 'dur' : (span.duration or 0)*1e6,
+						   'pid' : pids[span.session], 'tid' : span.thread,
+						   'args' : {'id' : span.id, 'parent' : span.parent, 'thread' : span.threadName, **(span.args or {})}})
+		return {'traceEvents' : events, 'displayTimeUnit' : 'ms'}
+
+	def exportChromeTrace(self, path : str, since : float = None, session = None) -> int:
+		spans = self.spans(since, session)
+		with open(path, 'w') as fHndl:
+			json.dump(self.chromeTrace(spans), fHndl)
+		return len(spans)
+
+
+g_spans = SpanRecorder()
+g_functionSeconds	= vwmetrics.g_metrics.histogram('function_seconds', 'wall time of @performance functions')
+g_functionErrors	= vwmetrics.g_metrics.counter('function_errors_total', '@performance functions that raised')
+
+def histogramReport() -> str:
+	"""A line per @performance function, most total time first, from g_functionSeconds."""
+	bounds = g_functionSeconds.bounds
+	labels = [f'<={bound*1000:g}ms' for bound in bounds[:-1]]+[f'>{bounds[-2]*1000:g}ms']
+	lines = []
+	for key, hist in sorted(g_functionSeconds.summary().items(), key=lambda item : -item[1]['sum']):
+		spread = ' '.join(f'{label}:{n}' for label, n in zip(labels, hist['buckets']) if n>0)
+		lines.append(f"{dict(key).get('function')} calls:{hist['count']} total:{hist['sum']:.3f}s mean:{hist['mean']*1000:.1f}ms p95<={hist['p95']*1000:g}ms [{spread}]")
+	return '\n'.join(lines)
+
+def spanTag(**kwargs) -> None:
+	g_spans.tag(**kwargs)
+
+def traceDir() -> str:
+	return os.environ.get(CONST_ENV_TRACE_DIR)
 
 def performance(func):
+	if g_disabled:
+		return func
+	name = f'{func.__module__}.{func.__qualname__}'
+	sampled = _sampler(func)
 	@wraps(func)
 	def perf_wrapper(*args, **kwargs):
+		#Ref 003, a call left out by sampling gets no span and no timing line
+		if not sampled():
+			return func(*args, **kwargs)
+		#Ref 002
+		span = g_spans.begin(name)
 		s = time.perf_counter()
-		ret = func(*args, **kwargs)
+		try:
+			ret = func(*args, **kwargs)
+		except Exception:
+			g_functionErrors.inc(function=name)
+			raise
+		finally:
+			g_spans.end(span)
+			#Ref 005
+			g_functionSeconds.observe(span.duration, function=name)
 		#Ref 001
-		logging.info(f"{CONST_STR_ARROW}[{func.__name__}]{CONST_STR_SEP}{CONST_STR_EXEC_TIME} {CONST_STR_SEP} {(time.perf_counter()-s):.2f} seconds")
+		logging.info("%s[%s]%s%s %s %.2f seconds", CONST_STR_ARROW, func.__name__, CONST_STR_SEP, CONST_STR_EXEC_TIME, CONST_STR_SEP, time.perf_counter()-s)
 		return ret
 	return perf_wrapper
 
+g_debugPayloads = os.environ.get(CONST_ENV_PAYLOADS, '').lower() in CONST_ENV_TRUE
+
+def debugPayloads() -> bool:
+	"""Should expensive payloads (DataFrame reprs, whole configs) be logged, they go out at DEBUG."""
+	return g_debugPayloads and logging.root.isEnabledFor(logging.DEBUG)
+
+
+class BoundedQueueHandler(QueueHandler):
+	"""QueueHandler over a bounded queue that applies dropPolicy when the queue is full.
+
+	Dropped records are counted, and once there is room again a warning saying
+	how many were lost is queued behind the next record that gets through.
+	"""
+
+	def __init__(self, maxSize : int = CONST_DEF_QUEUE_SIZE, dropPolicy : str = CONST_DROP_NEWEST):
+		if dropPolicy not in CONST_DROP_POLICIES:
+			raise ValueError(f'{dropPolicy} is not a drop policy, expected one of {CONST_DROP_POLICIES}')
+		super().__init__(queue.Queue(maxsize=maxSize))
+		self.dropPolicy	= dropPolicy
+		self.dropped	= 0
+		self._reported	= 0
+
+	def enqueue(self, record):
+		if self.dropPolicy == CONST_DROP_BLOCK:
+			self.queue.put(record)
+			return
+
+		if self.dropPolicy == CONST_DROP_OLDEST and self.queue.full():
+			try:
+				self.queue.get_nowait()
+				self.dropped += 1
+			except queue.Empty:
+				pass
+		try:
+			self.queue.put_nowait(record)
+		except queue.Full:
+			self.dropped += 1
+			return
+
+		dropped = self.dropped
+		if dropped > self._reported:
+			try:
+				self.queue.put_nowait(logging.makeLogRecord({'name' : __name__, 'levelno' : logging.WARNING, 'levelname' : 'WARNING',
+															 'msg' : f'{dropped-self._reported} log records dropped, the log queue was full ({self.dropPolicy})'}))
+				self._reported = dropped
+			except queue.Full:
+				pass
+
+
+g_queueHandler	= None
+g_listener		= None
+
+def setupLogging( level : int = CONST_DEF_LOGLEVEL, fmt : str = CONST_LOGGING_FMT,
+				  maxSize : int = None, dropPolicy : str = None, stream = None ) -> bool:
+	"""Route the root logger through a bounded queue to a background writer thread.
+
+	The logging thread only formats the message and queues it, the write to
+	stream (stderr by default) happens on the listener thread. maxSize and
+	dropPolicy default to VWLOGGER_QUEUE_SIZE / VWLOGGER_DROP_POLICY. Safe to call
+	on every rerun, only the first call sets anything up.
+	"""
+	global g_queueHandler, g_listener
+	if g_listener is not None:
+		return False
+
+	maxSize = int(os.environ.get(CONST_ENV_QUEUE, CONST_DEF_QUEUE_SIZE)) if maxSize is None else maxSize
+	dropPolicy = os.environ.get(CONST_ENV_DROP, CONST_DROP_NEWEST) if dropPolicy is None else dropPolicy
+	writer = logging.StreamHandler(sys.stderr if stream is None else stream)
+	writer.setFormatter(logging.Formatter(fmt))
+
+	g_queueHandler = BoundedQueueHandler(maxSize, dropPolicy)
+	g_listener = QueueListener(g_queueHandler.queue, writer, respect_handler_level=True)
+	logging.root.addHandler(g_queueHandler)
+	logging.root.setLevel(level)
+	g_listener.start()
+	atexit.register(stopLogging)
+	return True
+
+def stopLogging() -> None:
+	"""Flush what is queued and stop the writer thread."""
+	global g_queueHandler, g_listener
+	if g_listener is None:
+		return
+	g_listener.stop()
+	logging.root.removeHandler(g_queueHandler)
+	g_queueHandler, g_listener = None, None
+
+def loggingStats() -> dict:
+	if g_queueHandler is None:
+		return {'queued' : 0, 'dropped' : 0}
+	return {'queued' : g_queueHandler.queue.qsize(), 'dropped' : g_queueHandler.dropped, 'maxSize' : g_queueHandler.queue.maxsize, 'dropPolicy' : g_queueHandler.dropPolicy}
+
+
 def version() : 
 	print(f"{version.__module__}.{version.__name__} {CONST_VER}")
 
@@ -53,15 +390,24 @@ def main(argv):
 	logging.info(CONST_DEF_TESTMSG)
 	logging.warning(CONST_DEF_TESTMSG)
 	logging.error(CONST_DEF_TESTMSG)
+	_nested(3)
 	pass
+
+@performance
+def _nested(depth : int):
+	spanTag(depth=depth)
+	time.sleep(0.01)
+	if depth>0:
+		_nested(depth-1)
  
 # ----------------------------------------------------------------
 # ----------------------------------------------------------------
 # ----------------------------------------------------------------
 version()
 if __name__ == '__main__':
-	logging.basicConfig(level=CONST_DEF_LOGLEVEL,format=CONST_LOGGING_FMT)
+	setupLogging()
 	cmdLineArgs=argparse.ArgumentParser()
 	main(cmdLineArgs.parse_args())
+	print(histogramReport())
 
 	
\ No newline at end of file
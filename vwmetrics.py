@@ -0,0 +1,233 @@
+# Change History
+# Who	When		What						Version
+# ========================================================
+# 					In-process metrics, Prometheus text exposition		1.0
+
+import os
+import math
+import logging
+import threading
+
+from typing import Final
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONST_VER				: Final[str]	= '1.0'
+
+CONST_DEF_PREFIX		: Final[str]	= 'vw'
+CONST_DEF_BUCKETS		: Final[tuple]	= (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)	# seconds
+CONST_DEF_HTTP_HOST		: Final[str]	= '127.0.0.1'
+CONST_METRICS_PATH		: Final[str]	= '/metrics'
+CONST_CONTENT_TYPE		: Final[str]	= 'text/plain; version=0.0.4; charset=utf-8'
+CONST_TYPE_COUNTER		: Final[str]	= 'counter'
+CONST_TYPE_GAUGE		: Final[str]	= 'gauge'
+CONST_TYPE_HISTOGRAM	: Final[str]	= 'histogram'
+
+
+
+def _labelText( labels : tuple ) -> str :
+	if len(labels)==0:
+		return ''
+	escaped = (str(val).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, val in labels)
+	return '{'+','.join(f'{nom}="{val}"' for (nom, _), val in zip(labels, escaped))+'}'
+
+def _number( val : float ) -> str :
+	return '+Inf' if val == math.inf else repr(float(val))
+
+
+class Counter:
+	"""A monotonically increasing count per label set."""
+	kind = CONST_TYPE_COUNTER
+
+	def __init__(self, name : str, doc : str):
+		self.name	= name
+		self.doc	= doc
+		self._values= {}
+		self._lock	= threading.Lock()
+
+	def inc(self, amount : float = 1, **labels) -> None:
+		key = tuple(sorted(labels.items()))
+		with self._lock:
+			self._values[key] = self._values.get(key, 0)+amount
+
+	def samples(self) -> list:
+		with self._lock:
+			return [(self.name, key, val) for key, val in self._values.items()]
+
+
+class Histogram:
+	"""Observations per label set in cumulative le buckets, plus their sum and count."""
+	kind = CONST_TYPE_HISTOGRAM
+
+	def __init__(self, name : str, doc : str, buckets : tuple = CONST_DEF_BUCKETS):
+		self.name	= name
+		self.doc	= doc
+		self.bounds	= tuple(sorted(buckets))+(math.inf,)
+		self._values= {}	# labels -> [bucket counts..., sum, count]
+		self._lock	= threading.Lock()
+
+	def observe(self, val : float, **labels) -> None:
+		key = tuple(sorted(labels.items()))
+		with self._lock:
+			counts = self._values.get(key)
+			if counts is None:
+				counts = self._values[key] = [0]*len(self.bounds)+[0.0, 0]
+			counts[next(i for i, bound in enumerate(self.bounds) if val <= bound)] += 1
+			counts[-2] += val
+			counts[-1] += 1
+
+	def summary(self) -> dict:
+		"""labels -> count, sum, mean, the bucket bound that holds the 50th/95th percentile and
+		the count per bucket (not cumulative, in bounds order)."""
+		with self._lock:
+			values = {key : list(counts) for key, counts in self._values.items()}
+		summary = {}
+		for key, counts in values.items():
+			total, n = counts[-2], counts[-1]
+			cumulative = [sum(counts[:i+1]) for i in range(len(self.bounds))]
+			quantile = lambda q : next(bound for bound, c in zip(self.bounds, cumulative) if c >= q*n)
+			summary[key] = {'count' : n, 'sum' : total, 'mean' : total/n if n else 0.0, 'p50' : quantile(0.5), 'p95' : quantile(0.95),
+							'buckets' : counts[:len(self.bounds)]}
+		return summary
+
+	def samples(self) -> list:
+		with self._lock:
+			values = {key : list(counts) for key, counts in self._values.items()}
+		samples = []
+		for key, counts in values.items():
+			cumulative = 0
+			for bound, n in zip(self.bounds, counts):
+				cumulative += n
+				samples.append((f'{self.name}_bucket', key+(('le', _number(bound)),), cumulative))
+			samples.append((f'{self.name}_sum', key, counts[-2]))
+			samples.append((f'{self.name}_count', key, counts[-1]))
+		return samples
+
+
+class MetricsRegistry:
+	"""Counters and histograms the code updates, plus collectors that are read on scrape.
+
+	A collector is a function returning a dict of numbers (a cache's stats() for
+	instance), every numeric value becomes a gauge named <prefix>_<collector>_<key>.
+	"""
+
+	def __init__(self, prefix : str = CONST_DEF_PREFIX):
+		self.prefix		= prefix
+		self._metrics	= {}
+		self._collectors= {}
+		self._lock		= threading.Lock()
+
+	def _metric(self, cls, name : str, doc : str, *args):
+		fullName = f'{self.prefix}_{name}'
+		with self._lock:
+			metric = self._metrics.get(fullName)
+			if metric is None:
+				metric = self._metrics[fullName] = cls(fullName, doc, *args)
+			return metric
+
+	def counter(self, name : str, doc : str = '') -> Counter:
+		return self._metric(Counter, name, doc)
+
+	def histogram(self, name : str, doc : str = '', buckets : tuple = CONST_DEF_BUCKETS) -> Histogram:
+		return self._metric(Histogram, name, doc, buckets)
+
+	def collector(self, name : str, stats) -> None:
+		with self._lock:
+			self._collectors[name] = stats
+
+	def collected(self) -> dict:
+		"""collector name -> its numeric stats, a collector that fails is left out."""
+		with self._lock:
+			collectors = dict(self._collectors)
+		collected = {}
+		for name, stats in collectors.items():
+			try:
+				collected[name] = {key : val for key, val in stats().items() if isinstance(val, (int, float)) and not isinstance(val, bool)}
+			except Exception as err:
+				logging.warning(f'metrics collector {name} failed - {err}')
+		return collected
+
+	def exposition(self) -> str:
+		"""Everything in the Prometheus text exposition format."""
+		with self._lock:
+			metrics = list(self._metrics.values())
+		lines = []
+		for metric in metrics:
+			lines.append(f'# HELP {metric.name} {metric.doc}')
+			lines.append(f'# TYPE {metric.name} {metric.kind}')
+			lines.extend(f'{name}{_labelText(labels)} {_number(val)}' for name, labels, val in metric.samples())
+		for name, stats in self.collected().items():
+			for key, val in stats.items():
+				fullName = f'{self.prefix}_{name}_{key}'
+				lines.append(f'# TYPE {fullName} {CONST_TYPE_GAUGE}')
+				lines.append(f'{fullName} {_number(val)}')
+		return '\n'.join(lines)+'\n'
+
+	def writeTextFile(self, path : str) -> None:
+		"""Write the exposition to path atomically, for node_exporter's textfile collector."""
+		tmpPath = f'{path}.tmp'
+		with open(tmpPath, 'w') as fHndl:
+			fHndl.write(self.exposition())
+		os.replace(tmpPath, path)
+
+
+g_metrics = MetricsRegistry()
+g_server = None
+g_serverLock = threading.Lock()
+
+def serveHttp( port : int, host : str = CONST_DEF_HTTP_HOST, registry : MetricsRegistry = None ) -> bool:
+	"""Serve registry (g_metrics by default) on http://host:port/metrics from a daemon thread, once per process."""
+	global g_server
+	registry = g_metrics if registry is None else registry
+
+	class MetricsHandler(BaseHTTPRequestHandler):
+		def do_GET(self):
+			if self.path.split('?')[0] != CONST_METRICS_PATH:
+				self.send_error(404)
+				return
+			body = registry.exposition().encode()
+			self.send_response(200)
+			self.send_header('Content-Type', CONST_CONTENT_TYPE)
+			self.send_header('Content-Length', str(len(body)))
+			self.end_headers()
+			self.wfile.write(body)
+
+		def log_message(self, fmt, *args):
+			pass
+
+	with g_serverLock:
+		if g_server is not None:
+			return False
+		try:
+			g_server = ThreadingHTTPServer((host, port), MetricsHandler)
+		except OSError as err:
+			logging.error(f'metrics not served on {host}:{port} - {err}')
+			return False
+
+	threading.Thread(target=g_server.serve_forever, name='metrics-http', daemon=True).start()
+	logging.info(f'metrics served on http://{host}:{g_server.server_address[1]}{CONST_METRICS_PATH}')
+	return True
+
+def version() :
+	print(f"{version.__module__}.{version.__name__} {CONST_VER}")
+
+def main() -> int:
+	import time
+	import urllib.request
+	logging.basicConfig(level=logging.INFO)
+	calls = g_metrics.counter('demo_calls_total', 'demo calls')
+	latency = g_metrics.histogram('demo_seconds', 'demo latency')
+	for i in range(20):
+		calls.inc(handler='a' if i%2 else 'b')
+		latency.observe(i/100, handler='a' if i%2 else 'b')
+	g_metrics.collector('demo_cache', lambda : {'hits' : 3, 'misses' : 1, 'root' : '/tmp'})
+	serveHttp(0)
+	port = g_server.server_address[1]
+	print(urllib.request.urlopen(f'http://{CONST_DEF_HTTP_HOST}:{port}{CONST_METRICS_PATH}').read().decode())
+	print(latency.summary())
+	return 0
+# ----------------------------------------------------------------
+# ----------------------------------------------------------------
+# ----------------------------------------------------------------
+version()
+if __name__ == '__main__':
+	main()